@@ -4,6 +4,25 @@
 
 const DEFAULT_WS_PATH = process.env.NEXT_PUBLIC_WS_PATH || "/api/ws"
 
+// Binary audio frames (server.py AUDIO_FRAME_HEADER): kind u8, codec u8, turn u16, rate u32, little-endian
+const FRAME_KIND_AUDIO = 1
+const AUDIO_FRAME_HEADER_BYTES = 8
+const AUDIO_CODEC_IDS = { pcm16: 0, mulaw: 1, ima_adpcm: 2 }
+const DEFAULT_PLAYBACK_RATE = 24000
+
+// IMA ADPCM tables; every block starts with the coder state (int16 predictor, u8 step index, pad byte)
+const ADPCM_BLOCK_HEADER_BYTES = 4
+const ADPCM_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8]
+const ADPCM_STEP_TABLE = [
+  7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+  50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+  253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+  1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+  3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+  11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+  32767,
+]
+
 /*
 const buildDefaultServerUrl = () => {
   if (typeof window === "undefined") {
@@ -40,8 +59,12 @@ const buildDefaultServerUrl = () => {
 
 
 class AudioClient {
-  constructor(serverUrl = buildDefaultServerUrl()) {
+  // audioOptions: { transport: "json" | "binary", codec: "pcm16" | "mulaw" | "ima_adpcm",
+  //                 pacedAudio, adaptiveAudio } - negotiated in the user_id message
+  constructor(serverUrl = buildDefaultServerUrl(), audioOptions = {}) {
     this.serverUrl = serverUrl
+    this.audioOptions = { transport: "json", codec: "pcm16", ...audioOptions }
+    this.audioConfig = { transport: "json", audio_codec: "pcm16" } // confirmed by the server's audio_config
     this.ws = null
     this.recorder = null
     this.audioContext = null
@@ -63,11 +86,13 @@ class AudioClient {
     this.onError = () => {}
     this.onInterrupted = () => {}
     this.onSessionIdReceived = () => {}
+    this.onSummaryProgress = () => {}
 
     // Audio playback
-    this.audioQueue = []
+    this.audioQueue = [] // { samples: Float32Array, rate } chunks
     this.isPlaying = false
     this.currentSource = null
+    this.interruptedTurn = null // audio tagged with this turn arrived after its interruption
     this._isClosed = false // Flag to prevent reconnection after explicit close
   }
 
@@ -102,6 +127,7 @@ class AudioClient {
     return new Promise((resolve, reject) => {
       try {
         this.ws = new WebSocket(this.serverUrl)
+        this.ws.binaryType = "arraybuffer"
 
         const connectionTimeout = setTimeout(() => {
           if (!this.isConnected) {
@@ -120,12 +146,15 @@ class AudioClient {
           // Send user ID immediately upon connection if we have it
           if (this.userId) {
             console.log("📤 Sending user_id to server:", this.userId)
-            this.ws.send(
-              JSON.stringify({
-                type: "user_id",
-                data: this.userId,
-              })
-            )
+            const message = {
+              type: "user_id",
+              data: this.userId,
+              audio_transport: this.audioOptions.transport,
+              audio_codec: this.audioOptions.codec,
+            }
+            if (this.audioOptions.pacedAudio !== undefined) message.paced_audio = this.audioOptions.pacedAudio
+            if (this.audioOptions.adaptiveAudio !== undefined) message.adaptive_audio = this.audioOptions.adaptiveAudio
+            this.ws.send(JSON.stringify(message))
           } else {
             console.warn("⚠️ No userId set when WebSocket opened - server won't send ready!")
           }
@@ -150,6 +179,16 @@ class AudioClient {
 
         this.ws.onmessage = async (event) => {
           try {
+            if (event.data instanceof ArrayBuffer) {
+              // Binary audio frame: header + payload, no base64
+              const frame = this._unpackAudioFrame(event.data)
+              if (frame) {
+                this.onAudioReceived(frame)
+                await this.playAudio(frame.samples, frame.rate, frame.turn)
+              }
+              return
+            }
+
             // Log raw message data to help debug
             console.log("📨 Raw WebSocket message received:", event.data)
 
@@ -162,11 +201,18 @@ class AudioClient {
               this.onReady()
               console.log("✅ onReady callback executed")
               resolve()
+            } else if (message.type === "audio_config") {
+              // Audio settings the server accepted (it falls back to json/pcm16 for unsupported ones)
+              this.audioConfig = message.data
             } else if (message.type === "audio") {
               // Handle receiving audio data from server
               const audioData = message.data
               this.onAudioReceived(audioData)
-              await this.playAudio(audioData)
+              const samples = this._decodeAudio(
+                AUDIO_CODEC_IDS[this.audioConfig.audio_codec] ?? AUDIO_CODEC_IDS.pcm16,
+                this._base64ToArrayBuffer(audioData)
+              )
+              await this.playAudio(samples, message.rate || DEFAULT_PLAYBACK_RATE, message.turn)
             } else if (message.type === "text") {
               // Handle receiving text from server
               this.onTextReceived(message.data)
@@ -175,8 +221,9 @@ class AudioClient {
               this.isModelSpeaking = false
               this.onTurnComplete()
             } else if (message.type === "interrupted") {
-              // Response was interrupted
-              this.isModelSpeaking = false
+              // Response was interrupted: drop what is buffered and any late audio of that turn
+              this.interrupt()
+              this.interruptedTurn = message.turn ?? null
               this.onInterrupted(message.data)
             } else if (message.type === "error") {
               // Handle server error
@@ -186,6 +233,9 @@ class AudioClient {
               console.log("Received session ID message:", message)
               this.sessionId = message.data
               this.onSessionIdReceived(message.data)
+            } else if (message.type === "summary_progress") {
+              // Post-session summary fields, sent as soon as each one is generated
+              this.onSummaryProgress(message)
             }
           } catch (error) {
             console.error("Error processing message:", error)
@@ -262,7 +312,12 @@ class AudioClient {
 
         // Send to server if connected
         if (this.isConnected && this.isRecording) {
-          const audioBuffer = new Uint8Array(int16Data.buffer)
+          if (this.audioConfig.transport === "binary") {
+            // Binary frames carry their codec in the header, so raw PCM16 is always accepted
+            this.ws.send(this._packAudioFrame(int16Data, this.audioContext.sampleRate))
+            return
+          }
+          const audioBuffer = this._encodeAudio(this.audioConfig.audio_codec, int16Data)
           const base64Audio = this._arrayBufferToBase64(audioBuffer)
 
           this.ws.send(
@@ -321,19 +376,19 @@ class AudioClient {
     // For toggle recording, we just stop capturing/sending audio chunks
   }
 
-  // Decode and play received audio
-  async playAudio(base64Audio) {
+  // Queue decoded PCM16 samples of the given turn for playback at their sample rate
+  async playAudio(samples, rate = DEFAULT_PLAYBACK_RATE, turn = undefined) {
     if (this.inputMode === "text") {
       return // Don't play audio in text mode
     }
-    try {  
-      // Decode the base64 audio data
-      const audioData = this._base64ToArrayBuffer(base64Audio)
-
+    if (turn !== undefined && turn === this.interruptedTurn) {
+      return // Late audio of an interrupted turn, written before the server flushed the rest
+    }
+    try {
       // Create an audio context if needed
       if (!this.audioContext || this.audioContext.state === "closed") {
         this.audioContext = new (window.AudioContext || window.webkitAudioContext)({
-          sampleRate: 24000, // Match the sample rate received from server
+          sampleRate: DEFAULT_PLAYBACK_RATE, // Match the sample rate received from server
         })
       }
 
@@ -342,8 +397,12 @@ class AudioClient {
         await this.audioContext.resume()
       }
 
-      // Add to audio queue
-      this.audioQueue.push(audioData)
+      // Convert Int16 samples to Float32 for the AudioBuffer and add to audio queue
+      const float32Array = new Float32Array(samples.length)
+      for (let i = 0; i < samples.length; i++) {
+        float32Array[i] = samples[i] / 32768.0
+      }
+      this.audioQueue.push({ samples: float32Array, rate })
 
       // If not currently playing and not in text mode, start playback
       if (!this.isPlaying && !this.isTextMode) {
@@ -380,19 +439,12 @@ class AudioClient {
         this.currentSource = null
       }
 
-      // Get next audio data from queue
-      const audioData = this.audioQueue.shift()
+      // Get next audio chunk from queue
+      const { samples, rate } = this.audioQueue.shift()
 
-      // Convert Int16Array to Float32Array for AudioBuffer
-      const int16Array = new Int16Array(audioData)
-      const float32Array = new Float32Array(int16Array.length)
-      for (let i = 0; i < int16Array.length; i++) {
-        float32Array[i] = int16Array[i] / 32768.0
-      }
-
-      // Create an AudioBuffer
-      const audioBuffer = this.audioContext.createBuffer(1, float32Array.length, 24000)
-      audioBuffer.getChannelData(0).set(float32Array)
+      // Create an AudioBuffer at the chunk's own rate (adaptive audio may lower it); the context resamples
+      const audioBuffer = this.audioContext.createBuffer(1, samples.length, rate)
+      audioBuffer.getChannelData(0).set(samples)
 
       // Create a source node
       const source = this.audioContext.createBufferSource()
@@ -522,6 +574,141 @@ class AudioClient {
     this.isConnected = false
   }
 
+  // Parse a binary audio frame into { samples, rate, turn }; null for anything else
+  _unpackAudioFrame(buffer) {
+    if (buffer.byteLength < AUDIO_FRAME_HEADER_BYTES) {
+      console.error("Audio frame too short:", buffer.byteLength)
+      return null
+    }
+    const header = new DataView(buffer)
+    if (header.getUint8(0) !== FRAME_KIND_AUDIO) {
+      console.error("Unsupported frame kind:", header.getUint8(0))
+      return null
+    }
+    const codec = header.getUint8(1)
+    const turn = header.getUint16(2, true)
+    const rate = header.getUint32(4, true)
+    return { samples: this._decodeAudio(codec, buffer.slice(AUDIO_FRAME_HEADER_BYTES)), rate, turn }
+  }
+
+  // Build a binary audio frame of raw PCM16 for the server
+  _packAudioFrame(int16Data, sampleRate) {
+    const frame = new ArrayBuffer(AUDIO_FRAME_HEADER_BYTES + int16Data.byteLength)
+    const header = new DataView(frame)
+    header.setUint8(0, FRAME_KIND_AUDIO)
+    header.setUint8(1, AUDIO_CODEC_IDS.pcm16)
+    header.setUint16(2, 0, true)
+    header.setUint32(4, sampleRate, true)
+    new Uint8Array(frame, AUDIO_FRAME_HEADER_BYTES).set(new Uint8Array(int16Data.buffer))
+    return frame
+  }
+
+  // Decode a payload in the given codec id to an Int16Array
+  _decodeAudio(codec, buffer) {
+    if (codec === AUDIO_CODEC_IDS.mulaw) {
+      return this._decodeMulaw(new Uint8Array(buffer))
+    }
+    if (codec === AUDIO_CODEC_IDS.ima_adpcm) {
+      return this._decodeImaAdpcm(buffer)
+    }
+    return new Int16Array(buffer, 0, buffer.byteLength >> 1)
+  }
+
+  // Encode Int16 samples in the negotiated codec for the JSON transport
+  _encodeAudio(codecName, int16Data) {
+    if (codecName === "mulaw") {
+      return this._encodeMulaw(int16Data)
+    }
+    if (codecName === "ima_adpcm") {
+      return this._encodeImaAdpcm(int16Data)
+    }
+    return new Uint8Array(int16Data.buffer)
+  }
+
+  // G.711 mu-law
+  _decodeMulaw(codes) {
+    const out = new Int16Array(codes.length)
+    for (let i = 0; i < codes.length; i++) {
+      const code = ~codes[i] & 0xff
+      const exponent = (code >> 4) & 0x07
+      const magnitude = ((((code & 0x0f) << 3) + 0x84) << exponent) - 0x84
+      out[i] = code & 0x80 ? -magnitude : magnitude
+    }
+    return out
+  }
+
+  _encodeMulaw(int16Data) {
+    const out = new Uint8Array(int16Data.length)
+    for (let i = 0; i < int16Data.length; i++) {
+      let sample = int16Data[i] >> 2
+      const mask = sample < 0 ? 0x7f : 0xff
+      sample = Math.min(Math.abs(sample), 8159) + 0x21
+      let segment = 0
+      while (segment < 8 && sample > (0x40 << segment) - 1) segment++
+      const code = segment >= 8 ? 0x7f : (segment << 4) | ((sample >> (segment + 1)) & 0x0f)
+      out[i] = code ^ mask
+    }
+    return out
+  }
+
+  // IMA ADPCM: one self-describing block, nibbles packed high-nibble first
+  _decodeImaAdpcm(buffer) {
+    const header = new DataView(buffer)
+    let predictor = header.getInt16(0, true)
+    let index = header.getUint8(2)
+    const packed = new Uint8Array(buffer, ADPCM_BLOCK_HEADER_BYTES)
+    const out = new Int16Array(packed.length * 2)
+    let step = ADPCM_STEP_TABLE[index]
+    for (let i = 0; i < out.length; i++) {
+      const code = i & 1 ? packed[i >> 1] & 0x0f : packed[i >> 1] >> 4
+      index = Math.min(88, Math.max(0, index + ADPCM_INDEX_TABLE[code]))
+      let vpdiff = step >> 3
+      if (code & 4) vpdiff += step
+      if (code & 2) vpdiff += step >> 1
+      if (code & 1) vpdiff += step >> 2
+      predictor = Math.max(-32768, Math.min(32767, code & 8 ? predictor - vpdiff : predictor + vpdiff))
+      step = ADPCM_STEP_TABLE[index]
+      out[i] = predictor
+    }
+    return out
+  }
+
+  _encodeImaAdpcm(int16Data) {
+    // Each recorder chunk is encoded as its own block, starting from a zero state (all-zero header)
+    const count = int16Data.length & ~1
+    const out = new Uint8Array(ADPCM_BLOCK_HEADER_BYTES + count / 2)
+    let predictor = 0
+    let index = 0
+    let step = ADPCM_STEP_TABLE[index]
+    for (let i = 0; i < count; i++) {
+      let diff = int16Data[i] - predictor
+      const sign = diff < 0 ? 8 : 0
+      if (sign) diff = -diff
+      let code = 0
+      let vpdiff = step >> 3
+      if (diff >= step) {
+        code = 4
+        diff -= step
+        vpdiff += step
+      }
+      if (diff >= step >> 1) {
+        code |= 2
+        diff -= step >> 1
+        vpdiff += step >> 1
+      }
+      if (diff >= step >> 2) {
+        code |= 1
+        vpdiff += step >> 2
+      }
+      predictor = Math.max(-32768, Math.min(32767, sign ? predictor - vpdiff : predictor + vpdiff))
+      code |= sign
+      index = Math.min(88, Math.max(0, index + ADPCM_INDEX_TABLE[code]))
+      step = ADPCM_STEP_TABLE[index]
+      out[ADPCM_BLOCK_HEADER_BYTES + (i >> 1)] |= i & 1 ? code : code << 4
+    }
+    return out
+  }
+
   // Utility: Convert ArrayBuffer to Base64
   _arrayBufferToBase64(buffer) {
     let binary = ""
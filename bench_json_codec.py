@@ -0,0 +1,54 @@
+"""
+Microbenchmark for the WebSocket JSON codec (json_codec.py).
+
+Measures the per-message encode/decode cost of the stdlib json module against the
+codec server.py uses (orjson when installed), on the messages the server handles
+most often: outbound audio chunks, transcription fragments and control messages,
+plus inbound client audio.
+
+    python bench_json_codec.py [--iterations N]
+"""
+import argparse
+import base64
+import json
+import os
+import timeit
+
+import json_codec
+
+def sample_messages():
+    # 40 ms of 24 kHz PCM16 out, 40 ms of 16 kHz PCM16 in
+    audio_out = base64.b64encode(os.urandom(24000 * 2 * 40 // 1000)).decode("utf-8")
+    audio_in = base64.b64encode(os.urandom(16000 * 2 * 40 // 1000)).decode("utf-8")
+    outbound = {
+        "audio chunk": {"type": "audio", "data": audio_out, "turn": 3, "rate": 24000},
+        "transcription": {"type": "text", "data": " Great, let's warm up with"},
+        "control": {"type": "interrupted", "data": "Response interrupted by user input", "turn": 3},
+    }
+    inbound = {
+        "audio chunk": json.dumps({"type": "audio", "data": audio_in}),
+        "text": json.dumps({"type": "text", "data": "Can we do legs today?"}),
+    }
+    return outbound, inbound
+
+def per_call_us(fn, arg, iterations):
+    return min(timeit.repeat(lambda: fn(arg), number=iterations, repeat=5)) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    outbound, inbound = sample_messages()
+    rows = [("dumps", name, json.dumps, json_codec.dumps, msg) for name, msg in outbound.items()]
+    rows += [("loads", name, json.loads, json_codec.loads, msg) for name, msg in inbound.items()]
+
+    print(f"json_codec backend: {json_codec.BACKEND}  ({args.iterations} iterations, best of 5)")
+    print(f"{'op':<6} {'message':<14} {'stdlib us':>10} {'codec us':>10} {'speedup':>8}")
+    for op, name, baseline, codec, msg in rows:
+        before = per_call_us(baseline, msg, args.iterations)
+        after = per_call_us(codec, msg, args.iterations)
+        print(f"{op:<6} {name:<14} {before:>10.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
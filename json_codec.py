@@ -0,0 +1,28 @@
+"""
+JSON codec for WebSocket messages.
+
+Uses orjson when it is installed and falls back to the stdlib json module.
+`dumps` always returns str so messages keep going out as WebSocket text frames.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can keep catching the latter
+    loads = orjson.loads
+else:
+    BACKEND = "json"
+
+    def dumps(obj) -> str:
+        return json.dumps(obj)
+
+    loads = json.loads
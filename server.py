@@ -2,83 +2,21 @@ import asyncio
 import json
 import base64
 import os
-import requests
-from datetime import datetime, timezone
+import time
+import random
+import re
+import struct
+import uuid
+import warnings
+import aiohttp
+import numpy as np
+from collections import OrderedDict, deque
+from math import gcd, isfinite
+from scipy.signal import firwin
+from datetime import datetime, timedelta, timezone
 from google.auth.transport.requests import Request
 
-def extract_json(text: str) -> dict:
-    """Best-effort extraction of a JSON object from model output."""
-    if not text:
-        return {"raw": ""}
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        candidate = text[start:end + 1]
-        try:
-            return json.loads(candidate)
-        except Exception:
-            pass
-    return {"raw": text.strip()}
-
-def validate_mood_scores(summary_obj: dict) -> dict:
-    """Validate and correct mood scores to ensure they're within valid ranges."""
-    if not isinstance(summary_obj, dict):
-        return summary_obj
-    
-    # Define validation rules for each score field
-    score_fields = {
-        'mood_percentage': (0, 100),  # 0-100 scale (no negative values)
-        'energy_level': (0, 100),
-        'stress_level': (0, 100),
-        'cognitive_score': (0, 100),
-        'emotional_score': (0, 100),
-        'anxiety_level': (0, 100),
-        'physical_activity_minutes': (0, None),  # No upper limit for minutes
-    }
-    
-    # Validate and clamp scores
-    for field, (min_val, max_val) in score_fields.items():
-        if field in summary_obj and summary_obj[field] is not None:
-            try:
-                score = float(summary_obj[field])
-                
-                # Apply minimum constraint
-                if score < min_val:
-                    logger.warning(f"Clamping {field} from {score} to {min_val} (minimum)")
-                    score = min_val
-                
-                # Apply maximum constraint if specified
-                if max_val is not None and score > max_val:
-                    logger.warning(f"Clamping {field} from {score} to {max_val} (maximum)")
-                    score = max_val
-                
-                # Round to nearest integer for percentage scores
-                if field.endswith('_level') or field.endswith('_score') or field.endswith('_percentage'):
-                    summary_obj[field] = round(score)
-                else:
-                    summary_obj[field] = score
-                    
-            except (ValueError, TypeError):
-                logger.warning(f"Invalid {field} value: {summary_obj[field]}, setting to 0")
-                summary_obj[field] = 0
-    
-    # Special validation for sleep duration (should be reasonable)
-    if 'sleep_duration_hours' in summary_obj and summary_obj['sleep_duration_hours'] is not None:
-        try:
-            hours = float(summary_obj['sleep_duration_hours'])
-            if hours < 0:
-                summary_obj['sleep_duration_hours'] = 0
-            elif hours > 24:  # Cap at 24 hours
-                summary_obj['sleep_duration_hours'] = 24
-        except (ValueError, TypeError):
-            summary_obj['sleep_duration_hours'] = None
-    
-    return summary_obj
-
+import json_codec
 
 # Import Google Generative AI components
 from google import genai
@@ -107,6 +45,93 @@ LOCATION = "us-central1"
 MODEL = "gemini-live-2.5-flash-preview-native-audio"
 VOICE_NAME = "Puck"
 SEND_SAMPLE_RATE = 16000
+RECEIVE_SAMPLE_RATE = 24000  # Live API native audio output rate
+
+# Binary audio frames (negotiated per connection): header + raw audio payload.
+# Header fields: frame kind, codec, turn id, sample rate.
+AUDIO_FRAME_HEADER = struct.Struct("<BBHI")
+FRAME_KIND_AUDIO = 1
+AUDIO_CODEC_PCM16 = 0
+AUDIO_CODEC_MULAW = 1
+AUDIO_CODEC_IMA_ADPCM = 2
+AUDIO_CODEC_IDS = {"pcm16": AUDIO_CODEC_PCM16, "mulaw": AUDIO_CODEC_MULAW, "ima_adpcm": AUDIO_CODEC_IMA_ADPCM}
+
+# Client audio is coalesced into frames of this duration before going upstream
+UPSTREAM_FRAME_MS = 60
+AUDIO_FLUSH = object()  # audio queue marker: send whatever is buffered now (turn boundary)
+
+# Per-session client audio backlog (see AudioInbox)
+AUDIO_QUEUE_MAX_CHUNKS = 200
+AUDIO_LATENCY_BUDGET_MS = 1000        # older audio is dropped instead of being sent late
+AUDIO_OVERFLOW_POLICY = "drop_oldest"  # or "backpressure" (stop reading from the client)
+
+# Optional server-side voice activity detection on upstream audio (see EnergyVAD).
+# Clients can also opt in per connection with "vad": true in their user_id message.
+VAD_ENABLED = False
+VAD_ENERGY_THRESHOLD_DBFS = -45.0
+VAD_ZCR_MAX = 0.35          # quiet frames with more zero crossings than this are treated as hiss
+VAD_HANGOVER_MS = 400       # keep sending this long after speech stops
+VAD_KEEPALIVE_EVERY = 0     # while silent, still send every Nth frame (0 = suppress silence entirely)
+
+# Client input rates the server will resample to SEND_SAMPLE_RATE (see PolyphaseResampler)
+SUPPORTED_INPUT_SAMPLE_RATES = (8000, 11025, 16000, 22050, 24000, 32000, 44100, 48000)
+RESAMPLER_ZERO_CROSSINGS = 10   # filter half-length, in zero crossings of the anti-aliasing sinc
+
+# Shared HTTP connection pool for the Node.js backend
+BACKEND_HTTP_POOL_SIZE = 100
+BACKEND_HTTP_KEEPALIVE_SECONDS = 30
+BACKEND_TIMEOUT_SECONDS = 8.0          # deadline for each backend call made while summarizing
+SUMMARY_MODEL_TIMEOUT_SECONDS = 90.0   # deadline for the summarizer generate_content call
+
+# Background summarization workers (see SummaryWorkerPool)
+SUMMARY_WORKERS = 4
+SUMMARY_QUEUE_MAXSIZE = 500
+SUMMARY_MAX_ATTEMPTS = 4
+SUMMARY_RETRY_BASE_DELAY_SECONDS = 2.0
+SUMMARY_RETRY_MAX_DELAY_SECONDS = 30.0
+SUMMARY_ENQUEUE_TIMEOUT_SECONDS = 5.0
+SUMMARY_DRAIN_TIMEOUT_SECONDS = 120.0
+# Rolling checkpoint summaries during long sessions (0 disables the trigger)
+SUMMARY_CHECKPOINT_TURNS = 40          # unsummarized turns that trigger a checkpoint
+SUMMARY_CHECKPOINT_SECONDS = 300.0     # or time since the last summary started
+# Two-stage final summaries: a fast metrics + risk flags pass is saved first, the full
+# plan pass runs afterwards and updates the same record
+SUMMARY_TWO_STAGE = True
+SUMMARY_FAST_MAX_OUTPUT_TOKENS = 512
+# Stream the full summary pass and push fields to the client as they complete
+SUMMARY_STREAMING_ENABLED = True
+# Optional model-side context caching of the static summary prompt (see SummaryPrefixCache)
+SUMMARY_PREFIX_CACHE_ENABLED = False
+SUMMARY_PREFIX_CACHE_TTL_SECONDS = 3600
+SUMMARY_PREFIX_CACHE_RETRY_SECONDS = 600.0   # back-off after the cache could not be created or used
+# Explicit caches below the model's minimum input size are rejected (4096 tokens for
+# gemini-2.0-flash); the prefix is estimated at ~4 characters per token
+SUMMARY_PREFIX_CACHE_MIN_TOKENS = 4096
+# Optional on-disk transcript journal (see TranscriptJournal); orphans are summarized at startup
+TRANSCRIPT_JOURNAL_ENABLED = False
+TRANSCRIPT_JOURNAL_DIR = os.path.join(os.path.dirname(__file__), "transcript_journal")
+TRANSCRIPT_JOURNAL_FLUSH_SECONDS = 2.0
+
+# Per-connection outbound queue (see ClientSender)
+OUTBOUND_AUDIO_BUDGET_BYTES = 512 * 1024    # queued model audio before the oldest is dropped
+OUTBOUND_COALESCE_MAX_BYTES = 9600          # largest audio message built from queued chunks (~200 ms at 24 kHz);
+                                            # also bounds how much audio can still reach a client after barge-in
+OUTBOUND_CLOSE_TIMEOUT_SECONDS = 2.0        # time given to flush queued messages on disconnect
+# Optional real-time pacing of model audio (clients opt in with "paced_audio": true)
+OUTBOUND_PACING_ENABLED = False
+OUTBOUND_PACING_LEAD_MS = 60                # how far ahead of playback audio may be released
+# Optional adaptive outbound audio rate (clients opt in with "adaptive_audio": true; see LinkMonitor)
+ADAPTIVE_AUDIO_ENABLED = False
+ADAPTIVE_AUDIO_RATES = (24000, 16000, 8000)
+ADAPTIVE_WINDOW_SECONDS = 1.0               # drain-rate measurement window
+ADAPTIVE_BACKLOG_MS = 300                   # buffered audio beyond this means the link is falling behind
+ADAPTIVE_SEND_LOAD = 0.8                    # send() time per second of audio sent at which the writer is saturated
+ADAPTIVE_RECOVER_SECONDS = 8.0              # backlog-free time required before stepping back up
+
+# Per-UID cache of rendered system instructions (see ContextCache)
+CONTEXT_CACHE_MAX_ENTRIES = 512
+CONTEXT_CACHE_TTL_SECONDS = 300       # served as-is while younger than this
+CONTEXT_CACHE_STALE_SECONDS = 1800    # served stale + refreshed in background up to this age
 
 def should_refresh_token(creds, buffer_seconds=300):
     """
@@ -153,14 +178,98 @@ from google.oauth2 import service_account
 # ======== AUTHORIZATION BLOCK ========
 KEY_PATH = os.path.join(os.path.dirname(__file__), "service-account.json")
 SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
-creds = service_account.Credentials.from_service_account_file(KEY_PATH, scopes=SCOPES)
+CREDENTIAL_REFRESH_BUFFER_SECONDS = 300  # refresh this long before the token expires
+CREDENTIAL_CHECK_INTERVAL_SECONDS = 60
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = KEY_PATH
-client = genai.Client(
-    vertexai=True,
-    project=PROJECT_ID,
-    location=LOCATION,
-    credentials=creds,
-)
+
+
+class CredentialManager:
+    """
+    Owns the service-account credentials and the long-lived genai.Client shared by
+    all sessions. A background task refreshes the token ahead of expiry, so
+    connections normally pay no auth cost. Refreshes are single-flight.
+
+    The key file is read on first use, so importing this module needs no credentials.
+    """
+
+    def __init__(self, key_path=KEY_PATH, scopes=SCOPES):
+        self.key_path = key_path
+        self.scopes = scopes
+        self._creds = None
+        self._client = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def _load(self):
+        if self._creds is None:
+            self._creds = service_account.Credentials.from_service_account_file(self.key_path, scopes=self.scopes)
+            self._client = self._build_client(self._creds)
+
+    @property
+    def creds(self):
+        self._load()
+        return self._creds
+
+    @property
+    def client(self):
+        self._load()
+        return self._client
+
+    @staticmethod
+    def _build_client(creds):
+        return genai.Client(
+            vertexai=True,
+            project=PROJECT_ID,
+            location=LOCATION,
+            credentials=creds,
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def ensure_fresh(self):
+        """Return the shared client, refreshing first only if the token is about to expire."""
+        if should_refresh_token(self.creds, CREDENTIAL_REFRESH_BUFFER_SECONDS):
+            await self.refresh()
+        return self.client
+
+    async def refresh(self):
+        """Refresh the token off the event loop; concurrent callers share one refresh."""
+        async with self._lock:
+            if not should_refresh_token(self.creds, CREDENTIAL_REFRESH_BUFFER_SECONDS):
+                return  # Another caller refreshed while we waited for the lock
+            auth_start = datetime.now()
+            logger.info("🔄 Refreshing authentication credentials...")
+            try:
+                # The refreshed token is picked up by the existing client
+                await asyncio.to_thread(self.creds.refresh, Request())
+            except Exception as auth_error:
+                logger.error(f"❌ Token refresh failed: {auth_error}")
+                logger.info("🔄 Fallback: Recreating credentials from service account file...")
+                creds = service_account.Credentials.from_service_account_file(self.key_path, scopes=self.scopes)
+                await asyncio.to_thread(creds.refresh, Request())
+                self._creds = creds
+                self._client = self._build_client(creds)
+            auth_time = (datetime.now() - auth_start).total_seconds()
+            expiry_time = self.creds.expiry.strftime("%H:%M:%S") if self.creds.expiry else "unknown"
+            logger.info(f"✅ Token refreshed in {auth_time:.2f}s (expires at: {expiry_time})")
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.ensure_fresh()
+            except Exception as e:
+                logger.error(f"❌ Background credential refresh failed: {e}")
+            await asyncio.sleep(CREDENTIAL_CHECK_INTERVAL_SECONDS)
+
+
+credentials = CredentialManager()
 # ===================================
 
 # Define tool object (not used yet, but kept as in your code)
@@ -187,24 +296,6 @@ config = LiveConnectConfig(
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
-def extract_json(text: str) -> dict:
-    """Best-effort extraction of a JSON object from model output."""
-    if not text:
-        return {"raw": ""}
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        candidate = text[start:end + 1]
-        try:
-            return json.loads(candidate)
-        except Exception:
-            return {"raw": text.strip()}
-    return {"raw": text.strip()}
-
 def pick_summarizer_model(live_or_text_model: str) -> str:
     """
     Map Live/native-audio models to a compatible text model for generateContent.
@@ -227,49 +318,1847 @@ def pick_summarizer_model(live_or_text_model: str) -> str:
     return live_or_text_model or "gemini-1.5-flash"
 
 
+# ---------- Summary response schema ----------
+# Declared to the summarizer model as response_schema and compiled into the
+# normalizer that checks what comes back, so the two cannot drift apart.
+
+class SummaryFormatError(ValueError):
+    """Model output that is not a JSON object; the summary job is retried."""
+
+
+_TEXT = {"type": "STRING"}
+_OPTIONAL_TEXT = {"type": "STRING", "nullable": True}
+_TEXT_LIST = {"type": "ARRAY", "items": _TEXT}
+_SCORE = {"type": "INTEGER", "minimum": 0, "maximum": 100}
+_OPTIONAL_SCORE = {**_SCORE, "nullable": True}
+_COUNT = {"type": "INTEGER", "minimum": 0}
+
+def _object(properties: dict) -> dict:
+    # propertyOrdering keeps the model's output in declaration order, so streamed
+    # summaries produce the headline fields before the long plans
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": list(properties),
+        "propertyOrdering": list(properties),
+    }
+
+SUMMARY_RESPONSE_SCHEMA = _object({
+    "session_id": _TEXT,
+    "generated_at_utc": _TEXT,
+    "language": _TEXT,
+    "summary": _TEXT,
+    "main_points": _TEXT_LIST,
+    "fitness_topics_discussed": _TEXT_LIST,
+    "goals_or_hopes": _TEXT_LIST,
+    "action_items_suggested": _TEXT_LIST,
+    "progress_analysis": _TEXT,
+    "energy_level": _SCORE,
+    "recovery_quality": _OPTIONAL_TEXT,
+    "workout_adherence": _OPTIONAL_TEXT,
+    "motivation_level": _SCORE,
+    "form_quality_notes": _OPTIONAL_TEXT,
+    "nutrition_compliance": _OPTIONAL_TEXT,
+    "hydration_level": _OPTIONAL_TEXT,
+    "meal_timing_notes": _OPTIONAL_TEXT,
+    "sleep_quality": _OPTIONAL_TEXT,
+    "sleep_duration_hours": {"type": "NUMBER", "nullable": True, "minimum": 0, "maximum": 24},
+    "risk_flags": _object({
+        "mentions_injury_pain": {"type": "BOOLEAN"},
+        "unsafe_training_practices": {"type": "BOOLEAN"},
+        "extreme_diet_mentioned": {"type": "BOOLEAN"},
+        "medical_consultation_recommended": {"type": "BOOLEAN"},
+    }),
+    "workoutPlan": _object({
+        "schedule": _TEXT_LIST,
+        "exercises": {"type": "ARRAY", "items": _object({
+            "day": _TEXT,
+            "routines": {"type": "ARRAY", "items": _object({"name": _TEXT, "sets": _COUNT, "reps": _COUNT})},
+        })},
+    }),
+    "nutritionPlan": _object({
+        "dailyCalories": _COUNT,
+        "meals": {"type": "ARRAY", "items": _object({"name": _TEXT, "foods": _TEXT_LIST})},
+    }),
+    "suggestions": _TEXT_LIST,
+    "training_focus_areas": {"type": "ARRAY", "items": _object({
+        "name": _TEXT,
+        "confidence": {"type": "NUMBER", "minimum": 0, "maximum": 1},
+    })},
+})
+
+# Subset produced by the fast first pass of a two-stage summary. Its scores may be
+# null, so a segment that did not discuss them keeps the running summary's values.
+SUMMARY_METRICS_SCHEMA = _object({
+    name: _OPTIONAL_SCORE if SUMMARY_RESPONSE_SCHEMA["properties"][name] is _SCORE
+    else SUMMARY_RESPONSE_SCHEMA["properties"][name]
+    for name in (
+        "summary", "energy_level", "motivation_level", "recovery_quality", "workout_adherence",
+        "nutrition_compliance", "hydration_level", "sleep_quality", "sleep_duration_hours", "risk_flags",
+    )
+})
+
+def compile_normalizer(schema: dict):
+    """
+    Build a function that fits a parsed JSON value to `schema` in one pass:
+    numbers are coerced (from strings too) and clamped to minimum/maximum, wrong
+    types and missing fields get defaults (null when nullable), unknown keys are
+    dropped.
+    """
+    kind = schema["type"]
+    nullable = schema.get("nullable", False)
+
+    if kind == "OBJECT":
+        fields = [(name, compile_normalizer(sub)) for name, sub in schema["properties"].items()]
+
+        def normalize(value):
+            if not isinstance(value, dict):
+                value = {}
+            return {name: field(value.get(name)) for name, field in fields}
+        return normalize
+
+    if kind == "ARRAY":
+        item = compile_normalizer(schema["items"])
+
+        def normalize(value):
+            return [item(v) for v in value] if isinstance(value, list) else []
+        return normalize
+
+    if kind in ("INTEGER", "NUMBER"):
+        low, high = schema.get("minimum"), schema.get("maximum")
+        default = None if nullable else 0
+        cast = round if kind == "INTEGER" else float
+
+        def normalize(value):
+            if value is None or isinstance(value, bool):
+                return default
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return default
+            if not isfinite(number):
+                return default
+            if low is not None and number < low:
+                number = low
+            if high is not None and number > high:
+                number = high
+            return cast(number)
+        return normalize
+
+    if kind == "BOOLEAN":
+        def normalize(value):
+            if isinstance(value, str):
+                return value.strip().lower() in ("true", "yes", "1")
+            return bool(value)
+        return normalize
+
+    default = None if nullable else ""
+
+    def normalize(value):
+        if value is None:
+            return default
+        return value if isinstance(value, str) else str(value)
+    return normalize
+
+normalize_summary = compile_normalizer(SUMMARY_RESPONSE_SCHEMA)
+normalize_summary_metrics = compile_normalizer(SUMMARY_METRICS_SCHEMA)
+SUMMARY_FIELD_NORMALIZERS = {
+    name: compile_normalizer(sub) for name, sub in SUMMARY_RESPONSE_SCHEMA["properties"].items()
+}
+SUMMARY_METRICS_FIELDS = frozenset(SUMMARY_METRICS_SCHEMA["properties"])
+
+def parse_summary(text: str, normalize=normalize_summary) -> dict:
+    """Parse and normalize summarizer output; raises SummaryFormatError if it is not a JSON object."""
+    try:
+        value = json_codec.loads(text or "")
+    except json.JSONDecodeError as e:
+        raise SummaryFormatError(f"summary is not valid JSON: {e}") from None
+    if not isinstance(value, dict):
+        raise SummaryFormatError(f"summary is a JSON {type(value).__name__}, not an object")
+    return normalize(value)
+
+def merge_summary_fields(base, fields: dict) -> dict:
+    """
+    Copy of `base` (or {}) updated with `fields`. Fields that came back null or
+    empty (not discussed in this segment) keep the value `base` already has.
+    """
+    merged = dict(base or {})
+    for name, value in fields.items():
+        if (value is not None and value != "") or name not in merged:
+            merged[name] = value
+    return merged
+
+def response_text(response) -> str:
+    """Concatenated text parts of a generate_content response (or stream chunk)."""
+    text = ""
+    if response and getattr(response, "candidates", None):
+        for c in response.candidates:
+            if getattr(c, "content", None) and getattr(c.content, "parts", None):
+                for p in c.content.parts:
+                    if getattr(p, "text", None):
+                        text += p.text
+    return text
+
+
+_JSON_STRUCTURE = re.compile(r'[\\"{}\[\],]')
+
+class JsonFieldStream:
+    """
+    Incremental parser for a JSON object arriving in pieces.
+
+    `feed()` returns the top-level (name, value) pairs completed by the new text.
+    Only structural characters are visited and earlier input is never rescanned.
+    Only the pieces of the member still open are kept, and each completed member
+    is joined and decoded on its own.
+    """
+
+    def __init__(self):
+        self._member = []         # pieces of the open top-level member
+        self._skip = 0            # leading characters of the next piece escaped by a backslash
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, text: str) -> list:
+        fields = []
+        skip = self._skip
+        mark = 0  # start of the open member's text within this piece
+        for match in _JSON_STRUCTURE.finditer(text):
+            i = match.start()
+            if i < skip:
+                continue
+            ch = text[i]
+            if self._in_string:
+                if ch == "\\":
+                    skip = i + 2
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member = []
+                    mark = i + 1
+            elif ch == "," and self._depth == 1:
+                self._close_member(text[mark:i], fields)
+                mark = i + 1
+            elif ch in "}]":
+                if self._depth == 1:
+                    self._close_member(text[mark:i], fields)
+                self._depth -= 1
+        if self._depth >= 1:
+            self._member.append(text[mark:])
+        self._skip = max(0, skip - len(text))
+        return fields
+
+    def _close_member(self, tail, fields):
+        self._member.append(tail)
+        member, self._member = "".join(self._member), []
+        self._emit(member, fields)
+
+    @staticmethod
+    def _emit(member, fields):
+        if not member.strip():
+            return
+        try:
+            fields.extend(json_codec.loads("{" + member + "}").items())
+        except json.JSONDecodeError:
+            pass  # left to the full parse at the end
+
+
+# ---------- Summary prompts ----------
+# Everything that does not vary per session is built once here. The full pass sends
+# SUMMARY_PROMPT_PREFIX followed by a short per-session suffix, so the prefix is
+# identical on every call (and eligible for model-side context caching).
+
+# Instruction to produce STRICT JSON (no medical diagnoses)
+SUMMARY_SYSTEM_NOTE = (
+    "You are GenX AI, a supportive, expert fitness coach. "
+    "Summarize the user's full conversation in a fitness coaching context. "
+    "You must NOT provide any medical diagnosis or treatment for injuries. "
+    "Detect safety concerns (injuries, pain, unsafe practices) and reflect them as flags only. "
+    "Return STRICT JSON only—no markdown, no code fences, no extra text."
+)
+
+# JSON schema for fitness plan (matching convex/plan.ts structure)
+SUMMARY_SCHEMA_HINT = {
+    "session_id": "",        # filled from SESSION_ID
+    "generated_at_utc": "",  # filled from GENERATED_AT_UTC
+    "language": "auto",
+    "summary": "",
+    "main_points": [],
+    "fitness_topics_discussed": [],  # e.g., ["strength training", "nutrition", "cardio"]
+    "goals_or_hopes": [],
+    "action_items_suggested": [],
+    "progress_analysis": "",
+
+    # Fitness Progress Metrics
+    "energy_level": 0,  # 0-100 scale (workout energy and vitality)
+    "recovery_quality": None,  # e.g., "Well Rested", "Sore", "Fatigued"
+    "workout_adherence": None,  # e.g., "Consistent", "Inconsistent", "Improving"
+    "motivation_level": 0,  # 0-100 scale
+    "form_quality_notes": None,  # Notes on exercise form discussed
+
+    # Nutrition Tracking
+    "nutrition_compliance": None,  # e.g., "On Track", "Needs Improvement"
+    "hydration_level": None,  # e.g., "Well Hydrated", "Needs Improvement"
+    "meal_timing_notes": None,  # Notes on meal timing around workouts
+
+    # Physical Metrics
+    "sleep_quality": None,  # e.g., "Rested", "Okay", "Poor"
+    "sleep_duration_hours": None,  # numeric hours slept
+
+    # Workout Plan (if discussed/created during session)
+    "workoutPlan": {
+        "schedule": [],  # e.g., ["Monday", "Wednesday", "Friday"]
+        "exercises": []  # Array of {day, routines: [{name, sets, reps}]}
+    },
+
+    # Nutrition Plan (if discussed/created during session)
+    "nutritionPlan": {
+        "dailyCalories": 0,  # Must be NUMBER
+        "meals": []  # Array of {name, foods: []}
+    },
+
+    # Safety Flags
+    "risk_flags": {
+        "mentions_injury_pain": False,
+        "unsafe_training_practices": False,
+        "extreme_diet_mentioned": False,
+        "medical_consultation_recommended": False
+    },
+
+    # Coaching Notes
+    "suggestions": [],  # Non-medical coaching suggestions
+
+    # Training Focus Areas (confidence 0.0-1.0)
+    "training_focus_areas": [
+        {"name": "strength_training", "confidence": 0.0},
+        {"name": "cardiovascular_fitness", "confidence": 0.0},
+        {"name": "flexibility_mobility", "confidence": 0.0}
+    ]
+}
+
+SUMMARY_INSTRUCTIONS = (
+    "Analyze the following fitness coaching conversation transcript and combine it with the previous summary to create an updated summary. "
+    "The updated summary should reflect the user's fitness progress and current training state. "
+    "Focus on fitness goals, workout adherence, nutrition compliance, and progress discussed. "
+    "If a previous summary is provided, analyze the user's fitness progress over time in the 'progress_analysis' field. "
+    "Infer language if not explicit. "
+
+    "IMPORTANT - Fitness Metrics Analysis: "
+    "- 'energy_level' on a 0-100 scale representing workout energy and vitality. "
+    "- 'motivation_level' on a 0-100 scale representing training motivation. "
+    "- 'recovery_quality' as a descriptor (e.g., Well Rested, Sore, Fatigued). "
+    "- 'workout_adherence' describing training consistency (e.g., Consistent, Inconsistent, Improving). "
+    "- 'nutrition_compliance' describing diet adherence (e.g., On Track, Needs Improvement). "
+    "- 'form_quality_notes' capturing any exercise form discussions or corrections. "
+
+    "Sleep and Recovery: "
+    "- 'sleep_quality' as a descriptor (Rested/Okay/Poor) and 'sleep_duration_hours' as numeric value. "
+    "- 'hydration_level' describing hydration status. "
+    "- 'meal_timing_notes' capturing meal timing around workouts if discussed. "
+
+    "Workout and Nutrition Plans: "
+    "- If a workout plan was discussed/created, populate 'workoutPlan' with 'schedule' array and 'exercises' array. "
+    "- Each exercise must have 'day', and 'routines' array with objects containing 'name', 'sets' (NUMBER), 'reps' (NUMBER). "
+    "- If a nutrition plan was discussed/created, populate 'nutritionPlan' with 'dailyCalories' (NUMBER) and 'meals' array. "
+    "- Each meal must have 'name' and 'foods' array with food items as strings. "
+
+    "Safety Flags: "
+    "- 'mentions_injury_pain': true if user mentions pain or injury. "
+    "- 'unsafe_training_practices': true if dangerous exercise practices discussed. "
+    "- 'extreme_diet_mentioned': true if extreme or unhealthy diet practices mentioned. "
+    "- 'medical_consultation_recommended': true if medical consultation should be recommended. "
+
+    "Training Focus Areas: "
+    "Identify which training areas were emphasized in the session (strength_training, cardiovascular_fitness, flexibility_mobility, "
+    "nutrition_planning, injury_prevention, form_technique, progressive_overload, recovery_strategies). "
+    "Assign confidence scores (0.0-1.0) for each area. Only include areas with confidence > 0.6. "
+
+    "If information is not provided, set the corresponding field to null. "
+    "For workout and nutrition plans, only populate if explicitly discussed - otherwise leave as empty arrays. "
+    "Fill the provided JSON schema faithfully and only return the JSON object."
+)
+
+SUMMARY_PROMPT_PREFIX = (
+    f"{SUMMARY_INSTRUCTIONS}\n\n"
+    f"JSON_SCHEMA_EXAMPLE:\n{json.dumps(SUMMARY_SCHEMA_HINT, ensure_ascii=False, separators=(',', ':'))}"
+)
+
+SUMMARY_RUNNING_NOTE = (
+    "RUNNING_SUMMARY is the running summary of the earlier part of THIS session: carry its plans, "
+    "metrics, flags and progress analysis forward and only change what the new transcript changes. "
+    "PREVIOUS_SUMMARY is still the last summary from before this session; analyze progress against it."
+)
+
+# Fast metrics pass of a two-stage summary
+SUMMARY_METRICS_SYSTEM_NOTE = (
+    "You are GenX AI, a fitness coach. You must NOT provide any medical diagnosis. "
+    "Return STRICT JSON only."
+)
+
+SUMMARY_METRICS_PROMPT_PREFIX = (
+    "From the fitness coaching transcript below (and the previous and running summaries, if any), fill ONLY these fields: "
+    "a two-sentence 'summary', 'energy_level' and 'motivation_level' on a 0-100 scale, short descriptors for "
+    "recovery, adherence, nutrition, hydration and sleep, numeric 'sleep_duration_hours', and the safety "
+    "'risk_flags'. Use null for anything not discussed. Return only the JSON object.\n\n"
+    "JSON_SCHEMA_EXAMPLE:\n"
+    + json.dumps(
+        {name: SUMMARY_SCHEMA_HINT[name] for name in SUMMARY_METRICS_SCHEMA["properties"]},
+        ensure_ascii=False, separators=(",", ":"),
+    )
+)
+
+def summary_snapshot_text(summary_response) -> str:
+    """PREVIOUS_SUMMARY text from a /get-summary response: its summary text, or ""."""
+    summary_data = ((summary_response or {}).get("latestSummary") or {}).get("summary_data") or {}
+    return summary_data.get("summary") or ""
+
+def build_summary_context(previous_summary, running_summary="") -> str:
+    """PREVIOUS_SUMMARY (and RUNNING_SUMMARY, mid-session) blocks of a summary prompt."""
+    text = f"PREVIOUS_SUMMARY:\n{previous_summary}\n\n"
+    if running_summary:
+        text += f"{SUMMARY_RUNNING_NOTE}\n\nRUNNING_SUMMARY:\n{running_summary}\n\n"
+    return text
+
+def build_summary_suffix(session_id, generated_at, previous_summary, transcript, running_summary="") -> str:
+    """Per-session part of the full summary prompt, sent after SUMMARY_PROMPT_PREFIX."""
+    return (
+        f"SESSION_ID: {session_id}\n"
+        f"GENERATED_AT_UTC: {generated_at}\n\n"
+        f"{build_summary_context(previous_summary, running_summary)}"
+        f"TRANSCRIPT:\n{transcript}"
+    )
+
+
+def pack_audio_frame(payload, sample_rate, codec=AUDIO_CODEC_PCM16, turn_id=0) -> bytearray:
+    """
+    Build a binary audio frame: AUDIO_FRAME_HEADER followed by the raw payload.
+    The header is packed in place and the payload copied once into the frame.
+    """
+    frame = bytearray(AUDIO_FRAME_HEADER.size + len(payload))
+    AUDIO_FRAME_HEADER.pack_into(frame, 0, FRAME_KIND_AUDIO, codec, turn_id & 0xFFFF, sample_rate)
+    frame[AUDIO_FRAME_HEADER.size:] = payload
+    return frame
+
+def unpack_audio_frame(frame):
+    """
+    Parse a binary audio frame into (codec, turn_id, sample_rate, payload memoryview).
+    The payload is a view into `frame`; the first copy is made by AudioAggregator.
+    """
+    view = memoryview(frame)
+    if len(view) < AUDIO_FRAME_HEADER.size:
+        raise ValueError(f"audio frame too short ({len(view)} bytes)")
+    kind, codec, turn_id, sample_rate = AUDIO_FRAME_HEADER.unpack_from(view)
+    if kind != FRAME_KIND_AUDIO:
+        raise ValueError(f"unsupported frame kind {kind}")
+    return codec, turn_id, sample_rate, view[AUDIO_FRAME_HEADER.size:]
+
+def mime_sample_rate(mime_type: str, default: int) -> int:
+    """Read the rate parameter from a mime type like 'audio/pcm;rate=24000'."""
+    for param in (mime_type or "").split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key == "rate" and value.isdigit():
+            return int(value)
+    return default
+
+
+# ---------- Client link audio codecs ----------
+# The Gemini side always sees PCM16; these only apply to the browser link.
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop  # C implementation of IMA ADPCM (stdlib up to 3.12, audioop-lts after)
+except ImportError:
+    audioop = None
+
+_MULAW_BIAS = 0x84
+_MULAW_CLIP = 8159  # in 14-bit units
+
+def _build_mulaw_tables():
+    # Decode: all 256 codes -> PCM16
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    magnitude = ((((codes & 0x0F) << 3) + _MULAW_BIAS) << exponent) - _MULAW_BIAS
+    decode = np.where(codes & 0x80, -magnitude, magnitude).astype("<i2")
+
+    # Encode: every PCM16 value (indexed by its uint16 bit pattern) -> code,
+    # using the 14-bit G.711 reference arithmetic so results match audioop
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    biased = np.minimum(np.abs(samples), _MULAW_CLIP) + (_MULAW_BIAS >> 2)
+    segment = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), biased)
+    code = (np.minimum(segment, 7) << 4) | ((biased >> (np.minimum(segment, 7) + 1)) & 0x0F)
+    code = np.where(segment >= 8, 0x7F, code)
+    encode = (code ^ mask).astype(np.uint8)
+    return encode, decode
+
+_MULAW_ENCODE, _MULAW_DECODE = _build_mulaw_tables()
+
+def encode_mulaw(pcm) -> bytes:
+    """G.711 mu-law encode PCM16 (one table lookup per sample)."""
+    samples = np.frombuffer(pcm, dtype="<u2", count=len(pcm) // 2)
+    return _MULAW_ENCODE[samples].tobytes()
+
+def decode_mulaw(data) -> bytes:
+    """G.711 mu-law decode to PCM16."""
+    return _MULAW_DECODE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+# IMA ADPCM. Every block starts with the coder state (predictor, step index) so the
+# client can decode any block on its own, even after dropped blocks. Nibbles are
+# packed high-nibble first, matching audioop.
+_ADPCM_BLOCK_HEADER = struct.Struct("<hBx")
+_ADPCM_INDEX_TABLE = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+_ADPCM_STEP_TABLE = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+)
+
+def _adpcm_encode_py(samples, predictor, index):
+    step_table, index_table = _ADPCM_STEP_TABLE, _ADPCM_INDEX_TABLE
+    codes = bytearray(len(samples))
+    step = step_table[index]
+    for i, value in enumerate(samples):
+        diff = value - predictor
+        sign = 8 if diff < 0 else 0
+        if sign:
+            diff = -diff
+        code = 0
+        vpdiff = step >> 3
+        if diff >= step:
+            code = 4
+            diff -= step
+            vpdiff += step
+        half = step >> 1
+        if diff >= half:
+            code |= 2
+            diff -= half
+            vpdiff += half
+        quarter = step >> 2
+        if diff >= quarter:
+            code |= 1
+            vpdiff += quarter
+        predictor = predictor - vpdiff if sign else predictor + vpdiff
+        if predictor > 32767:
+            predictor = 32767
+        elif predictor < -32768:
+            predictor = -32768
+        code |= sign
+        index = min(88, max(0, index + index_table[code]))
+        step = step_table[index]
+        codes[i] = code
+    nibbles = np.frombuffer(codes, dtype=np.uint8)
+    return ((nibbles[0::2] << 4) | nibbles[1::2]).tobytes(), predictor, index
+
+def _adpcm_decode_py(packed, predictor, index):
+    step_table, index_table = _ADPCM_STEP_TABLE, _ADPCM_INDEX_TABLE
+    raw = np.frombuffer(packed, dtype=np.uint8)
+    codes = np.empty(raw.size * 2, dtype=np.uint8)
+    codes[0::2] = raw >> 4
+    codes[1::2] = raw & 0x0F
+    out = np.empty(codes.size, dtype="<i2")
+    step = step_table[index]
+    for i, code in enumerate(codes.tolist()):
+        index = min(88, max(0, index + index_table[code]))
+        vpdiff = step >> 3
+        if code & 4:
+            vpdiff += step
+        if code & 2:
+            vpdiff += step >> 1
+        if code & 1:
+            vpdiff += step >> 2
+        predictor = predictor - vpdiff if code & 8 else predictor + vpdiff
+        if predictor > 32767:
+            predictor = 32767
+        elif predictor < -32768:
+            predictor = -32768
+        step = step_table[index]
+        out[i] = predictor
+    return out.tobytes()
+
+class ImaAdpcmEncoder:
+    """
+    Stateful IMA ADPCM encoder producing self-describing blocks (4:1 vs PCM16).
+
+    Blocks hold whole bytes, i.e. an even number of samples. An odd sample left at
+    the end of a chunk is carried into the next `encode()`; `flush()` emits it at
+    the end of a turn and `reset()` drops it when the turn is interrupted.
+    """
+
+    def __init__(self):
+        self.predictor = 0
+        self.index = 0
+        self._carry = None  # odd trailing sample (int16 array of length 1) not encoded yet
+
+    def encode(self, pcm) -> bytes:
+        samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+        if self._carry is not None:
+            samples = np.concatenate((self._carry, samples))
+            self._carry = None
+        if samples.size % 2:
+            self._carry = samples[-1:].copy()
+            samples = samples[:-1]
+        return self._encode_block(samples)
+
+    def flush(self) -> bytes:
+        """Encode the carried sample, if any (repeated to fill the last byte)."""
+        if self._carry is None:
+            return b""
+        samples = np.repeat(self._carry, 2)
+        self._carry = None
+        return self._encode_block(samples)
+
+    def reset(self):
+        self._carry = None
+
+    def _encode_block(self, samples) -> bytes:
+        header = _ADPCM_BLOCK_HEADER.pack(self.predictor, self.index)
+        if audioop is not None:
+            packed, (self.predictor, self.index) = audioop.lin2adpcm(
+                samples.tobytes(), 2, (self.predictor, self.index)
+            )
+        else:
+            packed, self.predictor, self.index = _adpcm_encode_py(samples.tolist(), self.predictor, self.index)
+        return header + packed
+
+def decode_ima_adpcm(block) -> bytes:
+    """Decode one IMA ADPCM block (state header + packed nibbles) to PCM16."""
+    predictor, index = _ADPCM_BLOCK_HEADER.unpack_from(block)
+    if index > 88:
+        raise ValueError(f"invalid ADPCM step index {index}")
+    packed = bytes(block[_ADPCM_BLOCK_HEADER.size:])
+    if audioop is not None:
+        pcm, _ = audioop.adpcm2lin(packed, 2, (predictor, index))
+        return pcm
+    return _adpcm_decode_py(packed, predictor, index)
+
+
+class Pcm16Encoder:
+    def encode(self, pcm) -> bytes:
+        return bytes(pcm)
+
+    def flush(self) -> bytes:
+        return b""
+
+    def reset(self):
+        pass
+
+class MuLawEncoder:
+    def encode(self, pcm) -> bytes:
+        return encode_mulaw(pcm)
+
+    def flush(self) -> bytes:
+        return b""
+
+    def reset(self):
+        pass
+
+def make_audio_encoder(codec_id):
+    """
+    Return an encoder for outbound audio in the given codec: `.encode(pcm)` per
+    chunk, `.flush()` at the end of a turn and `.reset()` when a turn is interrupted.
+    """
+    if codec_id == AUDIO_CODEC_MULAW:
+        return MuLawEncoder()
+    if codec_id == AUDIO_CODEC_IMA_ADPCM:
+        return ImaAdpcmEncoder()
+    return Pcm16Encoder()
+
+def decode_client_audio(codec_id, payload):
+    """Decode client audio in `codec_id` to PCM16 (PCM16 payloads pass through untouched)."""
+    if codec_id == AUDIO_CODEC_PCM16:
+        return payload
+    if codec_id == AUDIO_CODEC_MULAW:
+        return decode_mulaw(payload)
+    if codec_id == AUDIO_CODEC_IMA_ADPCM:
+        return decode_ima_adpcm(payload)
+    raise ValueError(f"unsupported audio codec {codec_id}")
+
+
+class AudioAggregator:
+    """
+    Coalesces PCM16 chunks into fixed-duration, sample-aligned frames.
+
+    Input is copied into a preallocated buffer through a memoryview, and each
+    completed frame is copied out as bytes for the Live API; `push()` returns the
+    frames it completed and `flush()` returns whatever is buffered, trimmed to a
+    whole number of samples.
+    """
+
+    def __init__(self, sample_rate=SEND_SAMPLE_RATE, frame_ms=UPSTREAM_FRAME_MS, sample_width=2):
+        self.sample_width = sample_width
+        self.frame_bytes = max(1, sample_rate * frame_ms // 1000) * sample_width
+        self.frame_seconds = frame_ms / 1000
+        self._buf = bytearray(self.frame_bytes)
+        self._view = memoryview(self._buf)
+        self._fill = 0
+
+    @property
+    def pending(self) -> int:
+        return self._fill
+
+    def push(self, chunk) -> list:
+        src = memoryview(chunk).cast("B")
+        frames = []
+        pos, size = 0, len(src)
+        while pos < size:
+            take = min(self.frame_bytes - self._fill, size - pos)
+            self._view[self._fill:self._fill + take] = src[pos:pos + take]
+            self._fill += take
+            pos += take
+            if self._fill == self.frame_bytes:
+                frames.append(bytes(self._view))
+                self._fill = 0
+        return frames
+
+    def flush(self):
+        usable = self._fill - self._fill % self.sample_width
+        if not usable:
+            return None
+        frame = bytes(self._view[:usable])
+        leftover = self._fill - usable
+        if leftover:
+            # Keep a dangling half-sample for the next chunk
+            self._view[:leftover] = self._view[usable:self._fill]
+        self._fill = leftover
+        return frame
+
+
+class AudioInbox:
+    """
+    Bounded per-session queue of client audio chunks.
+
+    When full, the "drop_oldest" policy discards the oldest chunk and "backpressure"
+    makes put() wait, which stops reading from the client socket. Either way,
+    chunks that waited longer than the latency budget are dropped by get() rather
+    than sent upstream late. Drops are counted per session.
+    """
+
+    def __init__(self, maxsize=AUDIO_QUEUE_MAX_CHUNKS, latency_budget_ms=AUDIO_LATENCY_BUDGET_MS,
+                 policy=AUDIO_OVERFLOW_POLICY):
+        if policy not in ("drop_oldest", "backpressure"):
+            raise ValueError(f"unknown audio overflow policy: {policy}")
+        self.policy = policy
+        self.latency_budget = latency_budget_ms / 1000
+        self.dropped_chunks = 0
+        self.dropped_bytes = 0
+        self._queue = asyncio.Queue(maxsize=maxsize)
+
+    async def put(self, item):
+        if self.policy == "drop_oldest" and self._queue.full():
+            self._drop_oldest_chunk()
+        await self._queue.put((time.monotonic(), item))
+
+    def _drop_oldest_chunk(self):
+        # Rotate the queue once, dropping the first audio chunk; AUDIO_FLUSH markers
+        # mark turn boundaries and must survive an overflow.
+        entries = [self._queue.get_nowait() for _ in range(self._queue.qsize())]
+        for index, (_, item) in enumerate(entries):
+            if item is not AUDIO_FLUSH:
+                self._drop(entries.pop(index)[1], "queue full")
+                break
+        for entry in entries:
+            self._queue.put_nowait(entry)
+
+    async def get(self):
+        while True:
+            enqueued_at, item = await self._queue.get()
+            if item is AUDIO_FLUSH or time.monotonic() - enqueued_at <= self.latency_budget:
+                return item
+            self._drop(item, "over latency budget")
+
+    def _drop(self, item, reason):
+        if item is AUDIO_FLUSH:
+            return
+        self.dropped_chunks += 1
+        self.dropped_bytes += len(item)
+        if self.dropped_chunks == 1 or self.dropped_chunks % 50 == 0:
+            logger.warning(f"Dropping client audio ({reason}): {self.dropped_chunks} chunks / {self.dropped_bytes} bytes so far")
+
+
+class EnergyVAD:
+    """
+    Vectorized energy / zero-crossing voice activity detector for PCM16 frames.
+
+    `process(frame)` returns (frames_to_send, event), where event is "speech_start",
+    "speech_end" or None. Speech keeps flowing for a hangover period after it stops,
+    the last silent frame is held as pre-roll so onsets are not clipped, and silence
+    is suppressed (or thinned to every `keepalive_every`-th frame).
+    """
+
+    def __init__(self, threshold_dbfs=VAD_ENERGY_THRESHOLD_DBFS, zcr_max=VAD_ZCR_MAX,
+                 hangover_ms=VAD_HANGOVER_MS, keepalive_every=VAD_KEEPALIVE_EVERY,
+                 frame_ms=UPSTREAM_FRAME_MS):
+        self.threshold_dbfs = threshold_dbfs
+        self.zcr_max = zcr_max
+        self.hangover_frames = max(1, -(-hangover_ms // frame_ms))
+        self.keepalive_every = keepalive_every
+        self.active = False
+        self._quiet_frames = 0
+        self._silent_frames = 0
+        self._preroll = None
+
+    def is_speech(self, frame) -> bool:
+        samples = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+        if samples.size < 2:
+            return False
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        dbfs = 20.0 * np.log10(max(rms, 1.0) / 32768.0)
+        if dbfs < self.threshold_dbfs:
+            return False
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[1:] != signs[:-1]) / samples.size
+        # Broadband noise just above the threshold crosses zero far more often than voice
+        return zcr <= self.zcr_max or dbfs >= self.threshold_dbfs + 10.0
+
+    def process(self, frame):
+        if self.is_speech(frame):
+            self._quiet_frames = 0
+            if not self.active:
+                self.active = True
+                frames = [self._preroll, frame] if self._preroll else [frame]
+                self._preroll = None
+                return frames, "speech_start"
+            return [frame], None
+
+        if self.active:
+            self._quiet_frames += 1
+            if self._quiet_frames <= self.hangover_frames:
+                return [frame], None
+            self.active = False
+            self._silent_frames = 0
+            self._preroll = frame
+            return [], "speech_end"
+
+        self._silent_frames += 1
+        if self.keepalive_every and self._silent_frames % self.keepalive_every == 0:
+            self._preroll = None
+            return [frame], None
+        self._preroll = frame
+        return [], None
+
+
+class PolyphaseResampler:
+    """
+    Stateful rational-ratio resampler for PCM16 mono audio.
+
+    A Kaiser-windowed low-pass FIR is split into `up` polyphase branches once, and
+    each chunk is filtered with one vectorized gather + multiply-accumulate. The
+    filter history and output phase carry over between chunks, so a stream can be
+    fed in arbitrary chunk sizes without clicks at the boundaries. A chunk ending
+    in half a sample keeps that byte for the next one.
+    """
+
+    def __init__(self, in_rate, out_rate, zero_crossings=RESAMPLER_ZERO_CROSSINGS):
+        g = gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = out_rate // g
+        self.down = in_rate // g
+        ratio = max(self.up, self.down)
+        taps = firwin(
+            2 * zero_crossings * ratio + 1,
+            0.95 / ratio,
+            window=("kaiser", 8.0),
+        ) * self.up
+        self.taps_per_phase = -(-len(taps) // self.up)
+        padded = np.zeros(self.taps_per_phase * self.up, dtype=np.float32)
+        padded[:len(taps)] = taps
+        # phases[p, j] = taps[p + j * up]
+        self._phases = padded.reshape(self.taps_per_phase, self.up).T.copy()
+        self._offsets = np.arange(self.taps_per_phase)
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._t = 0  # next output position, in upsampled samples from the start of the next chunk
+        self._odd = b""  # trailing half-sample of the previous chunk
+
+    def process(self, pcm) -> bytes:
+        if self._odd:
+            pcm = self._odd + pcm
+            self._odd = b""
+        if len(pcm) % 2:
+            self._odd = bytes(pcm[-1:])
+        x = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2).astype(np.float32)
+        if x.size == 0:
+            return b""
+        buf = np.concatenate((self._history, x))
+        span = x.size * self.up
+        count = max(0, -(-(span - self._t) // self.down))
+        t = self._t + self.down * np.arange(count)
+        # Input index of the newest tap for each output, shifted past the carried history
+        newest = t // self.up + (self.taps_per_phase - 1)
+        window = buf[newest[:, None] - self._offsets]
+        y = np.einsum("ij,ij->i", self._phases[t % self.up], window)
+
+        self._t += count * self.down - span
+        if self.taps_per_phase > 1:
+            self._history = buf[-(self.taps_per_phase - 1):]
+        return np.clip(np.rint(y), -32768, 32767).astype("<i2").tobytes()
+
+
+class ClientAudioOptions:
+    """
+    Audio settings negotiated by the client in its initial user_id message, e.g.
+    {"type": "user_id", "data": uid, "audio_transport": "binary", "audio_codec": "mulaw"}.
+    Clients that send nothing extra keep the JSON/base64 protocol.
+    """
+
+    def __init__(self, binary=False, vad=VAD_ENABLED, input_rate=SEND_SAMPLE_RATE, codec="pcm16",
+                 paced=OUTBOUND_PACING_ENABLED, adaptive=ADAPTIVE_AUDIO_ENABLED):
+        self.binary = binary
+        self.vad = vad
+        self.paced = paced
+        self.adaptive = adaptive
+        self.input_rate = input_rate
+        self.codec_name = codec
+        self.codec = AUDIO_CODEC_IDS[codec]
+
+    @classmethod
+    def from_message(cls, data: dict):
+        input_rate = data.get("input_sample_rate", SEND_SAMPLE_RATE)
+        if input_rate not in SUPPORTED_INPUT_SAMPLE_RATES:
+            logger.warning(f"Unsupported input_sample_rate {input_rate}; expecting {SEND_SAMPLE_RATE} Hz audio")
+            input_rate = SEND_SAMPLE_RATE
+        codec = data.get("audio_codec", "pcm16")
+        if codec not in AUDIO_CODEC_IDS:
+            logger.warning(f"Unsupported audio_codec {codec!r}; using pcm16")
+            codec = "pcm16"
+        return cls(
+            binary=data.get("audio_transport") == "binary",
+            vad=bool(data.get("vad", VAD_ENABLED)),
+            input_rate=input_rate,
+            codec=codec,
+            paced=bool(data.get("paced_audio", OUTBOUND_PACING_ENABLED)),
+            adaptive=bool(data.get("adaptive_audio", ADAPTIVE_AUDIO_ENABLED)),
+        )
+
+    def describe(self) -> dict:
+        return {
+            "transport": "binary" if self.binary else "json",
+            "vad": self.vad,
+            "input_sample_rate": self.input_rate,
+            "audio_codec": self.codec_name,
+            "paced_audio": self.paced,
+            "adaptive_audio": self.adaptive,
+        }
+
+
+class LinkMonitor:
+    """Watches a client link's send backlog and steps the outbound audio rate down or back up."""
+
+    def __init__(self, transport, rates=ADAPTIVE_AUDIO_RATES, queued_seconds=None):
+        self.transport = transport
+        self.rates = rates
+        self.queued_seconds = queued_seconds  # callable: seconds of audio waiting in the sender's queue
+        self.level = 0
+        self.drain_rate = None  # bytes/second over the last window
+        self.send_load = 0.0    # send() time per second of audio sent, over the last window
+        now = time.monotonic()
+        self._clean_since = now
+        self._reset_window(now)
+
+    @property
+    def rate(self):
+        return self.rates[self.level]
+
+    def _buffered(self):
+        try:
+            return self.transport.get_write_buffer_size()
+        except Exception:
+            return 0
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._buffered_start = self._buffered()
+        self._sent = 0
+        self._audio_wire = 0
+        self._audio_seconds = 0.0
+        self._send_seconds = 0.0
+
+    def record(self, wire_bytes, audio_seconds=0.0, send_seconds=0.0):
+        """Account for one message handed to the socket (`send_seconds`: time send() took)."""
+        self._sent += wire_bytes
+        if audio_seconds:
+            self._audio_wire += wire_bytes
+            self._audio_seconds += audio_seconds
+            self._send_seconds += send_seconds
+
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < ADAPTIVE_WINDOW_SECONDS:
+            return
+        buffered = self._buffered()
+        self.drain_rate = max(0, self._sent - (buffered - self._buffered_start)) / elapsed
+        demand = self._audio_wire / self._audio_seconds if self._audio_seconds else 0.0
+        backlog_ms = 1000 * buffered / demand if demand else 0.0
+        self.send_load = self._send_seconds / self._audio_seconds if self._audio_seconds else 0.0
+        queued_ms = 0.0
+        if self.queued_seconds is not None and self.send_load >= ADAPTIVE_SEND_LOAD:
+            queued_ms = 1000 * self.queued_seconds()
+        socket_behind = backlog_ms > ADAPTIVE_BACKLOG_MS and self.drain_rate < demand
+        queue_behind = queued_ms > ADAPTIVE_BACKLOG_MS
+
+        if socket_behind or queue_behind:
+            self._clean_since = now
+            if self.level < len(self.rates) - 1:
+                self.level += 1
+                logger.info(
+                    f"📶 Client link draining {self.drain_rate:.0f} B/s ({demand:.0f} B/s needed), "
+                    f"{queued_ms:.0f} ms queued at send load {self.send_load:.2f}; "
+                    f"outbound audio down to {self.rate} Hz"
+                )
+        elif max(backlog_ms, queued_ms) > ADAPTIVE_BACKLOG_MS / 4:
+            self._clean_since = now
+        elif self.level > 0 and now - self._clean_since >= ADAPTIVE_RECOVER_SECONDS:
+            self.level -= 1
+            self._clean_since = now
+            logger.info(f"📶 Client link recovered; outbound audio up to {self.rate} Hz")
+        self._reset_window(now)
+
+
+class ClientSender:
+    """Per-connection outbound queue (control, text, then audio lane) drained by a single writer task."""
+
+    def __init__(self, websocket, audio_budget=OUTBOUND_AUDIO_BUDGET_BYTES,
+                 pacing_lead_ms=OUTBOUND_PACING_LEAD_MS):
+        self.websocket = websocket
+        self.audio_budget = audio_budget
+        self.pacing_lead = pacing_lead_ms / 1000
+        self.audio_options = ClientAudioOptions()
+        self.encoder = make_audio_encoder(AUDIO_CODEC_PCM16)
+        self.link = None
+        self._resampler = None
+        self._encoded = None  # (sample_rate, turn_id) of the last audio handed to the encoder
+        self.dropped_audio_bytes = 0
+        self.flushed_audio_bytes = 0
+        self.turn_id = 0
+        self._interrupted_turn = None  # turn ended by interrupt() with no audio queued since
+        self._play_clock = 0.0  # monotonic time at which the client runs out of sent audio
+        self._control = deque()
+        self._text = deque()
+        self._audio = deque()  # (pcm, sample_rate, turn_id) tuples or ordered JSON messages
+        self._audio_bytes = 0
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closed = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def configure(self, audio_options):
+        """Apply the audio settings negotiated for this connection."""
+        self.audio_options = audio_options
+        self.encoder = make_audio_encoder(audio_options.codec)
+        if audio_options.adaptive:
+            self.link = LinkMonitor(
+                getattr(self.websocket, "transport", None), queued_seconds=self.queued_audio_seconds
+            )
+
+    def send_control(self, message: dict):
+        self._enqueue(self._control, message)
+
+    def send_text(self, message: dict):
+        self._enqueue(self._text, message)
+
+    def send_ordered(self, message: dict):
+        """Queue a JSON message behind the audio already queued (e.g. turn_complete)."""
+        self._enqueue(self._audio, message)
+
+    def send_audio(self, pcm, sample_rate):
+        if self._closed:
+            return
+        self._interrupted_turn = None
+        self._audio.append((pcm, sample_rate, self.turn_id))
+        self._audio_bytes += len(pcm)
+        while self._audio_bytes > self.audio_budget:
+            self._drop_oldest_audio()
+        self._wake()
+
+    def queued_audio_seconds(self) -> float:
+        """Playback time of the model audio waiting in the audio lane."""
+        return sum(len(item[0]) / (2 * item[1]) for item in self._audio if isinstance(item, tuple))
+
+    def next_turn(self):
+        """
+        Start a new model turn; returns the id of the turn that just ended. The
+        turn_complete that follows an interruption ends the interrupted turn, which
+        interrupt() already closed, so it does not start another one.
+        """
+        if self._interrupted_turn is not None:
+            ended, self._interrupted_turn = self._interrupted_turn, None
+            return ended
+        ended = self.turn_id
+        self.turn_id = (self.turn_id + 1) & 0xFFFF
+        return ended
+
+    def interrupt(self):
+        """Discard all not-yet-sent audio and start a new turn; returns the interrupted turn id."""
+        kept = deque(item for item in self._audio if not isinstance(item, tuple))
+        flushed = self._audio_bytes
+        self._audio = kept
+        self._audio_bytes = 0
+        self.flushed_audio_bytes += flushed
+        self._play_clock = 0.0  # the client drops its buffer too
+        self.encoder.reset()
+        if flushed:
+            logger.info(f"🔇 Flushed {flushed} bytes of queued audio on interruption")
+        if self._interrupted_turn is None:
+            self._interrupted_turn = self.next_turn()
+        return self._interrupted_turn
+
+    async def close(self, timeout=OUTBOUND_CLOSE_TIMEOUT_SECONDS):
+        """Give queued messages a moment to go out, then stop the writer."""
+        if self._task is None:
+            return
+        if not self._closed:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._closed = True
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Summary jobs may outlive the connection; don't keep its socket and audio alive
+        self._control.clear()
+        self._text.clear()
+        self._audio.clear()
+        self._audio_bytes = 0
+        self.websocket = None
+        self.link = None
+        if self.dropped_audio_bytes:
+            logger.info(f"📉 Dropped {self.dropped_audio_bytes} bytes of outbound audio for a slow client")
+
+    def _enqueue(self, lane, message):
+        if not self._closed:
+            lane.append(message)
+            self._wake()
+
+    def _wake(self):
+        self._idle.clear()
+        self._wakeup.set()
+
+    def _drop_oldest_audio(self):
+        for i, item in enumerate(self._audio):
+            if isinstance(item, tuple):
+                del self._audio[i]
+                self._audio_bytes -= len(item[0])
+                self.dropped_audio_bytes += len(item[0])
+                return
+
+    def _next_message(self):
+        """Return (message, seconds of audio in it), or (None, 0) if nothing is queued."""
+        if self._control:
+            return json_codec.dumps(self._control.popleft()), 0.0
+        if self._text:
+            return json_codec.dumps(self._text.popleft()), 0.0
+        if not self._audio:
+            return None, 0.0
+        item = self._audio.popleft()
+        if not isinstance(item, tuple):
+            tail = self._flush_encoder()
+            if tail is not None:
+                # The end of the turn's audio goes out before the message that closes it
+                self._audio.appendleft(item)
+                return tail, 0.0
+            return json_codec.dumps(item), 0.0
+
+        # Coalesce consecutive queued chunks of the same turn and rate into one message
+        pcm, rate, turn_id = item
+        max_bytes = OUTBOUND_COALESCE_MAX_BYTES
+        if self.audio_options.paced:
+            max_bytes = min(max_bytes, int(self.pacing_lead * rate) * 2)
+        chunks, size = [pcm], len(pcm)
+        while (self._audio and isinstance(self._audio[0], tuple) and self._audio[0][1:] == (rate, turn_id)
+               and size + len(self._audio[0][0]) <= max_bytes):
+            chunks.append(self._audio.popleft()[0])
+            size += len(chunks[-1])
+        self._audio_bytes -= size
+        seconds = size / (2 * rate)
+        self._play_clock = max(self._play_clock, time.monotonic()) + seconds
+        pcm = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        return self._encode_audio(pcm, rate, turn_id), seconds
+
+    def _encode_audio(self, pcm, rate, turn_id):
+        if self.link is not None and self.link.rate < rate:
+            resampler = self._resampler
+            if resampler is None or (resampler.in_rate, resampler.out_rate) != (rate, self.link.rate):
+                resampler = self._resampler = PolyphaseResampler(rate, self.link.rate)
+            pcm, rate = resampler.process(pcm), self.link.rate
+        if self._encoded is not None and self._encoded[1] != turn_id:
+            self.encoder.reset()
+        self._encoded = (rate, turn_id)
+        return self._frame_audio(self.encoder.encode(pcm), rate, turn_id)
+
+    def _flush_encoder(self):
+        """Frame whatever the encoder still holds for the current turn, or None."""
+        payload = self.encoder.flush()
+        if not payload or self._encoded is None:
+            return None
+        rate, turn_id = self._encoded
+        return self._frame_audio(payload, rate, turn_id)
+
+    def _frame_audio(self, payload, rate, turn_id):
+        if self.audio_options.binary:
+            return pack_audio_frame(payload, rate, codec=self.audio_options.codec, turn_id=turn_id)
+        return json_codec.dumps({
+            "type": "audio", "data": base64.b64encode(payload).decode("utf-8"), "turn": turn_id, "rate": rate
+        })
+
+    def _pacing_delay(self):
+        """Seconds to hold back the next audio chunk (0 if something can be sent now)."""
+        if (not self.audio_options.paced or self._control or self._text
+                or not self._audio or not isinstance(self._audio[0], tuple)):
+            return 0.0
+        return self._play_clock - self.pacing_lead - time.monotonic()
+
+    async def _run(self):
+        while True:
+            delay = self._pacing_delay()
+            if delay > 0:
+                # Sleep until the client needs more audio, or a new message arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            message, audio_seconds = self._next_message()
+            if message is None:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                started = time.monotonic()
+                await self.websocket.send(message)
+                if self.link is not None:
+                    self.link.record(len(message), audio_seconds, time.monotonic() - started)
+            except ConnectionClosed:
+                self._closed = True
+                self._control.clear()
+                self._text.clear()
+                self._audio.clear()
+                self._audio_bytes = 0
+                self._idle.set()
+                return
+            except Exception as se:
+                logger.error(f"Error sending message over WS: {se}")
+
+
+class UserContext:
+    """
+    Connect-time snapshot of a user: the rendered system instruction and the previous
+    summary text from /get-summary, the same payload summarization would fetch
+    (None if it could not be loaded). Both are built and cached together, so the
+    ContextCache invalidation on every summary save drops them together. `version`
+    is the ContextCache version of the UID when the snapshot was served; a save
+    since then tells summarization the snapshot is out of date.
+    """
+
+    __slots__ = ("instruction", "previous_summary", "version")
+
+    def __init__(self, instruction, previous_summary=None, version=0):
+        self.instruction = instruction
+        self.previous_summary = previous_summary
+        self.version = version
+
+
+class ContextCache:
+    """
+    Size-bounded LRU cache of built user contexts (UserContext) keyed by UID.
+
+    Entries younger than `ttl` are returned as-is. Entries up to `stale_ttl` old are
+    returned immediately while a single background rebuild refreshes them
+    (stale-while-revalidate). Concurrent misses for the same UID share one build.
+    `invalidate()` drops the entry and discards any build that started before it.
+    """
+
+    def __init__(self, max_entries=CONTEXT_CACHE_MAX_ENTRIES,
+                 ttl=CONTEXT_CACHE_TTL_SECONDS, stale_ttl=CONTEXT_CACHE_STALE_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self._entries = OrderedDict()  # uid -> (stored_at, value)
+        self._versions = {}            # uid -> invalidation counter
+        self._builds = {}              # uid -> in-flight build task
+
+    async def get_or_build(self, uid, build):
+        """Return the cached value for `uid`, calling `await build(uid)` on a miss."""
+        entry = self._entries.get(uid)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age <= self.stale_ttl:
+                self._entries.move_to_end(uid)
+                if age > self.ttl:
+                    logger.info(f"♻️  Serving stale context for UID {uid} ({age:.0f}s old), refreshing in background")
+                    self._refresh(uid, build)
+                else:
+                    logger.info(f"⚡ Context cache hit for UID {uid} ({age:.0f}s old)")
+                return value
+            del self._entries[uid]
+
+        # Shield so a caller timing out does not cancel a build others are waiting on
+        return await asyncio.shield(self._refresh(uid, build))
+
+    def version(self, uid):
+        """Invalidation counter of `uid`; bumped by every `invalidate()`."""
+        return self._versions.get(uid, 0)
+
+    def invalidate(self, uid):
+        """Forget the cached value for `uid` (e.g. after a new summary was saved)."""
+        self._versions[uid] = self._versions.get(uid, 0) + 1
+        self._entries.pop(uid, None)
+        self._builds.pop(uid, None)
+
+    def _refresh(self, uid, build):
+        task = self._builds.get(uid)
+        if task is None:
+            task = asyncio.create_task(self._build(uid, build, self._versions.get(uid, 0)))
+            self._builds[uid] = task
+
+            def _done(t, uid=uid):
+                if self._builds.get(uid) is t:
+                    del self._builds[uid]
+            task.add_done_callback(_done)
+        return task
+
+    async def _build(self, uid, build, version):
+        try:
+            value = await build(uid)
+        except Exception as e:
+            logger.error(f"Context build failed for UID {uid}: {e}")
+            return None
+        # Only cache successful builds that were not invalidated while running
+        if value is not None and self._versions.get(uid, 0) == version:
+            self._entries[uid] = (time.monotonic(), value)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+class SummaryPrefixCache:
+    """
+    Optional model-side context cache of the static summary prompt
+    (SUMMARY_SYSTEM_NOTE + SUMMARY_PROMPT_PREFIX), one per summarizer model.
+
+    `get()` returns the cached-content name, creating or renewing it as needed, or
+    None when caching is disabled or unavailable; callers then send the prefix
+    inline. After a failure the cache is left alone for SUMMARY_PREFIX_CACHE_RETRY_SECONDS.
+    A prefix smaller than SUMMARY_PREFIX_CACHE_MIN_TOKENS is never cached (today's
+    prefix is about 1k tokens, so enabling this only pays off once it grows).
+    """
+
+    def __init__(self, credentials, enabled=SUMMARY_PREFIX_CACHE_ENABLED, ttl=SUMMARY_PREFIX_CACHE_TTL_SECONDS,
+                 min_tokens=SUMMARY_PREFIX_CACHE_MIN_TOKENS):
+        self.credentials = credentials
+        self.enabled = enabled
+        self.ttl = ttl
+        self._names = {}  # model -> (cached content name, monotonic renewal time)
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+        prefix_tokens = (len(SUMMARY_SYSTEM_NOTE) + len(SUMMARY_PROMPT_PREFIX)) // 4
+        if enabled and prefix_tokens < min_tokens:
+            logger.info(f"Summary prompt prefix (~{prefix_tokens} tokens) is below the {min_tokens}-token "
+                        "caching minimum; sending it inline")
+            self.enabled = False
+
+    def _lookup(self, model):
+        entry = self._names.get(model)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        return None
+
+    async def get(self, model):
+        if not self.enabled or time.monotonic() < self._retry_at:
+            return None
+        name = self._lookup(model)
+        if name is not None:
+            return name
+        async with self._lock:
+            name = self._lookup(model)
+            if name is not None:
+                return name
+            try:
+                cache = await self.credentials.client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        display_name="genx-summary-prefix",
+                        system_instruction=SUMMARY_SYSTEM_NOTE,
+                        contents=[types.Content(role="user", parts=[types.Part(text=SUMMARY_PROMPT_PREFIX)])],
+                        ttl=f"{int(self.ttl)}s",
+                    ),
+                )
+            except Exception as e:
+                logger.warning(f"Summary prompt caching unavailable, sending the prefix inline: {e}")
+                self.invalidate()
+                return None
+            # Renew a minute before the server drops it; expired entries need no cleanup
+            self._names[model] = (cache.name, time.monotonic() + max(self.ttl - 60, 0))
+            logger.info(f"Cached summary prompt prefix for {model}: {cache.name}")
+            return cache.name
+
+    def invalidate(self):
+        """Forget cached prefixes and send prompts inline until the retry delay has passed."""
+        self._names.clear()
+        self._retry_at = time.monotonic() + SUMMARY_PREFIX_CACHE_RETRY_SECONDS
+
+    @staticmethod
+    def is_cache_error(error):
+        """Whether a generate call failed because of its cached content (expired, deleted, ...)."""
+        text = str(error).lower()
+        return "cachedcontent" in text or "cached content" in text or "cached_content" in text
+
+
+class TranscriptTurn:
+    """One speaker turn; consecutive same-role fragments are appended to `parts`."""
+
+    __slots__ = ("role", "parts", "offset_ns")
+
+    def __init__(self, role, text, offset_ns):
+        self.role = role
+        self.parts = [text]
+        self.offset_ns = offset_ns  # monotonic ns since the session started
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+class SessionTranscript:
+    """
+    Compact transcript of one session.
+
+    Streaming transcription arrives as many small fragments; consecutive fragments
+    from the same role are merged into a single TranscriptTurn. Turns carry a
+    monotonic offset from the session start instead of a formatted timestamp.
+    `seal()` closes the current turn so fragments that arrive after a summary
+    snapshot start a new one.
+
+    Indexes count every turn of the session; `release()` drops turns that have been
+    summarized, and slices simply omit them. When `journal` is set every change is
+    also recorded there so the transcript can be rebuilt after a crash.
+    """
+
+    __slots__ = ("turns", "started_at", "journal", "_started_ns", "_sealed", "_base")
+
+    def __init__(self, started_at=None):
+        self.turns = []
+        self.started_at = started_at or datetime.now(timezone.utc)
+        self.journal = None
+        self._started_ns = time.monotonic_ns()
+        self._sealed = False
+        self._base = 0  # number of released turns
+
+    def append(self, role, text, new_turn=False, offset_ns=None):
+        if not text:
+            return
+        if offset_ns is None:
+            offset_ns = time.monotonic_ns() - self._started_ns
+        if self.turns and not (new_turn or self._sealed) and self.turns[-1].role == role:
+            self.turns[-1].parts.append(text)
+        else:
+            self.turns.append(TranscriptTurn(role, text, offset_ns))
+        self._sealed = new_turn
+        if self.journal is not None:
+            self.journal.record({"op": "append", "role": role, "text": text, "new": new_turn, "t": offset_ns})
+
+    def seal(self):
+        if self.journal is not None and not self._sealed:
+            self.journal.record({"op": "seal"})
+        self._sealed = True
+
+    def release(self, upto):
+        """Drop turns before index `upto` (they have been summarized)."""
+        drop = upto - self._base
+        if drop > 0:
+            del self.turns[:drop]
+            self._base = upto
+
+    def __len__(self):
+        return self._base + len(self.turns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self.turns[max(start - self._base, 0):max(stop - self._base, 0):step]
+        return self.turns[index - self._base if index >= 0 else index]
+
+    @staticmethod
+    def flatten(turns):
+        """Render turns as 'ROLE: text' lines for the summarization prompt."""
+        lines = []
+        for turn in turns:
+            text = turn.text.strip()
+            if text:
+                lines.append(f"{turn.role.upper()}: {text}")
+        return "\n".join(lines)
+
+
+class TranscriptJournal:
+    """
+    Append-only JSON-lines journal of one session's transcript.
+
+    The first line describes the session; later lines record transcript appends and
+    seals, session handle changes and summarized watermarks. Entries are buffered in
+    memory and written by `flush()` in a worker thread, so the event loop never
+    blocks on disk. `replay()` rebuilds the session from a journal left behind by a
+    crashed or restarted server.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = []
+        self._lock = asyncio.Lock()  # keeps concurrent flushes in order
+
+    @classmethod
+    def create(cls, directory, state):
+        journal = cls(os.path.join(directory, f"{state.client_id}-{time.time_ns()}.jsonl"))
+        journal.record({
+            "op": "session",
+            "client_id": state.client_id,
+            "uid": state.uid,
+            "started_at": state.started_at.isoformat() if state.started_at else None,
+            "transcript_started_at": state.transcript.started_at.isoformat(),
+        })
+        return journal
+
+    def record(self, entry):
+        self._buffer.append(json_codec.dumps(entry))
+
+    async def flush(self):
+        async with self._lock:
+            if not self._buffer:
+                return
+            lines, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except OSError as e:
+                logger.error(f"Failed to write transcript journal {self.path}: {e}")
+
+    def _write(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def discard(self):
+        """Delete the journal once its session is fully summarized."""
+        async with self._lock:
+            self._buffer.clear()
+            try:
+                await asyncio.to_thread(os.remove, self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Failed to delete transcript journal {self.path}: {e}")
+
+    @staticmethod
+    def replay(path):
+        """Rebuild the SessionSummaryState recorded in the journal at `path` (None if unusable)."""
+        state = None
+        last_offset_ns = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json_codec.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash mid-write
+                op = entry.get("op")
+                if op == "session":
+                    started_at = entry.get("started_at")
+                    transcript = SessionTranscript(datetime.fromisoformat(entry["transcript_started_at"]))
+                    state = SessionSummaryState(
+                        entry.get("client_id"),
+                        entry.get("uid"),
+                        transcript,
+                        started_at=datetime.fromisoformat(started_at) if started_at else None,
+                    )
+                elif state is None:
+                    continue
+                elif op == "append":
+                    last_offset_ns = entry.get("t", last_offset_ns)
+                    state.transcript.append(entry["role"], entry["text"], entry.get("new", False), last_offset_ns)
+                elif op == "seal":
+                    state.transcript.seal()
+                elif op == "handle":
+                    state.session_handle = entry.get("id")
+                elif op == "summarized":
+                    state.watermark = max(state.watermark, entry.get("upto", 0))
+                    state.transcript.release(state.watermark)
+                    state.running_summary = entry.get("summary")
+                    state.unsaved = not entry.get("saved", True)
+        if state is None or not state.uid:
+            return None
+        if state.started_at is not None:
+            state.ended_at = state.started_at + timedelta(microseconds=last_offset_ns // 1000)
+        return state
+
+
+class SummaryJob:
+    """Snapshot of a session's transcript and metadata, handed to the summarization workers."""
+
+    def __init__(self, client_id, uid, transcript, session_handle=None, started_at=None, ended_at=None,
+                 checkpoint=False, running_summary=None, detail=False, summary_id=None, sender=None,
+                 context=None, baseline_text=None):
+        self.client_id = client_id
+        self.uid = uid
+        self.transcript = transcript
+        self.session_handle = session_handle
+        self.started_at = started_at
+        self.ended_at = ended_at or datetime.now()
+        self.checkpoint = checkpoint              # fold into the running summary without saving it
+        self.running_summary = running_summary    # running summary of the session so far, if any
+        self.baseline_text = baseline_text        # last summary from before this session, as given to the model
+        self.detail = detail                      # second stage of a two-stage final summary
+        self.summary_id = summary_id or uuid.uuid4().hex  # backend record id; retries update the same record
+        self.summary = None                       # summary produced by the handler
+        self.name_saved = False                   # save-name already posted by an earlier attempt
+        self.sender = sender                      # ClientSender for summary_progress, while connected
+        self.context = context                    # connect-time UserContext (previous summary snapshot)
+        self.attempts = 0
+        self.result = None  # asyncio.Future resolved with the handler's result (None on failure)
+
+
+class SessionSummaryState:
+    """
+    Per-session summarization bookkeeping.
+
+    `watermark` is the number of transcript turns already summarized (or being
+    summarized), so each segment is handed to the workers exactly once. `inflight`
+    is the task for the running segment; other triggers wait on it instead of
+    starting a duplicate.
+
+    Checkpoint segments fold the new turns into `running_summary` without saving
+    it; `unsaved` is set until a final segment (or a save of the running summary
+    alone) reaches the backend.
+    """
+
+    def __init__(self, client_id, uid, transcript, started_at=None):
+        self.client_id = client_id
+        self.uid = uid
+        self.transcript = transcript  # live SessionTranscript, appended to while the session runs
+        self.session_handle = None
+        self.started_at = started_at
+        self.ended_at = None  # set for sessions recovered from a journal
+        self.watermark = 0
+        self.inflight = None
+        self.result = None
+        self.running_summary = None
+        self.baseline_text = None  # last summary from before this session, once loaded
+        self.unsaved = False
+        self.detail = None  # task for the deferred full pass of the last final summary
+        self.sender = None  # the session's ClientSender
+        self.context = None  # UserContext loaded at connect time
+        self.last_summary_at = time.monotonic()
+
+    @property
+    def status(self):
+        if self.inflight is not None:
+            return "in_flight"
+        return "done" if self.watermark >= len(self.transcript) and not self.unsaved else "pending"
+
+    def checkpoint_due(self):
+        if self.inflight is not None:
+            return False
+        pending = len(self.transcript) - self.watermark
+        if pending <= 0:
+            return False
+        if SUMMARY_CHECKPOINT_TURNS and pending >= SUMMARY_CHECKPOINT_TURNS:
+            return True
+        return bool(SUMMARY_CHECKPOINT_SECONDS) and time.monotonic() - self.last_summary_at >= SUMMARY_CHECKPOINT_SECONDS
+
+
+class SummaryWorkerPool:
+    """
+    Bounded queue of SummaryJobs drained by a fixed number of async workers.
+
+    The handler is retried with exponential backoff when it raises or returns None.
+    `drain()` stops intake and waits for queued jobs to finish before shutting down.
+    """
+
+    def __init__(self, handler, workers=SUMMARY_WORKERS, maxsize=SUMMARY_QUEUE_MAXSIZE,
+                 max_attempts=SUMMARY_MAX_ATTEMPTS, base_delay=SUMMARY_RETRY_BASE_DELAY_SECONDS,
+                 max_delay=SUMMARY_RETRY_MAX_DELAY_SECONDS):
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks = []
+        self._closed = False
+
+    def start(self):
+        self._closed = False
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Started {self.workers} summarization workers (backlog limit {self._queue.maxsize})")
+
+    async def submit(self, job, timeout=SUMMARY_ENQUEUE_TIMEOUT_SECONDS):
+        """Queue a job and return its result future. Waits up to `timeout` for backlog space."""
+        job.result = asyncio.get_running_loop().create_future()
+        if self._closed:
+            logger.error(f"Summarization pool is shut down; dropping job for UID {job.uid}")
+            job.result.set_result(None)
+            return job.result
+        try:
+            await asyncio.wait_for(self._queue.put(job), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Summarization backlog full ({self._queue.qsize()} jobs); dropping job for UID {job.uid}")
+            job.result.set_result(None)
+        return job.result
+
+    async def drain(self, timeout=SUMMARY_DRAIN_TIMEOUT_SECONDS):
+        """Stop accepting jobs, wait for the backlog to finish, then stop the workers."""
+        self._closed = True
+        pending = self._queue.qsize()
+        if pending:
+            logger.info(f"Draining {pending} queued summarization jobs...")
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Summarization drain timed out with {self._queue.qsize()} jobs left")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job.result.done():
+                job.result.set_result(None)
+            self._queue.task_done()
+
+    async def _worker(self, n):
+        while True:
+            job = await self._queue.get()
+            try:
+                result = await self._run(job)
+                if not job.result.done():
+                    job.result.set_result(result)
+            except asyncio.CancelledError:
+                if not job.result.done():
+                    job.result.set_result(None)
+                raise
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        while True:
+            job.attempts += 1
+            try:
+                result = await self.handler(job)
+                if result is not None:
+                    return result
+                error = "handler returned no result"
+            except Exception as e:
+                error = e
+                logger.error(traceback.format_exc())
+
+            if job.attempts >= self.max_attempts:
+                logger.error(f"❌ Summarization for UID {job.uid} failed after {job.attempts} attempts: {error}")
+                return None
+            delay = min(self.max_delay, self.base_delay * 2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+            logger.warning(f"Summarization attempt {job.attempts} for UID {job.uid} failed ({error}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
 class LiveAPIWebSocketServer:
     """WebSocket server implementation using Gemini LiveAPI directly."""
 
     def __init__(self, host="0.0.0.0", port=8765):
         self.host = host
         self.port = port
+        self.credentials = credentials
         self.active_clients = {}
         self.session_transcripts = {}
         self.session_ids = {}
         self.user_ids = {}
         self.session_start_times = {}  # NEW: Track session start times for duration calculation
+        self.context_cache = ContextCache()
+        self.prefix_cache = SummaryPrefixCache(credentials)
+        self.http = None  # aiohttp.ClientSession, created in start()
+        self.summary_pool = SummaryWorkerPool(self.summarize_and_store)
+        self.summary_states = {}        # client_id -> SessionSummaryState
+        self._background_tasks = set()  # summaries triggered by disconnects
+        self.journals = {}              # path -> TranscriptJournal of each unfinished session (when journaling)
 
     async def start(self):
         logger.info(f"Starting WebSocket server on {self.host}:{self.port}")
-        async with websockets.serve(self.handle_client, self.host, self.port):
-            await asyncio.Future()
+        self._http_session()
+        self.credentials.start()
+        self.summary_pool.start()
+        journal_flusher = None
+        if TRANSCRIPT_JOURNAL_ENABLED:
+            ensure_dir(TRANSCRIPT_JOURNAL_DIR)
+            # Anything on disk before we start serving belongs to a previous run
+            orphans = sorted(
+                os.path.join(TRANSCRIPT_JOURNAL_DIR, name)
+                for name in os.listdir(TRANSCRIPT_JOURNAL_DIR)
+                if name.endswith(".jsonl")
+            )
+            if orphans:
+                logger.info(f"Found {len(orphans)} orphaned transcript journal(s)")
+                self._spawn(self.recover_journals(orphans))
+            journal_flusher = asyncio.create_task(self._flush_journals())
+        try:
+            async with websockets.serve(self.handle_client, self.host, self.port):
+                await asyncio.Future()
+        finally:
+            if journal_flusher is not None:
+                journal_flusher.cancel()
+            # Finish queued summaries before the backend session goes away
+            if self._background_tasks:
+                await asyncio.wait(self._background_tasks, timeout=SUMMARY_DRAIN_TIMEOUT_SECONDS)
+            await self.summary_pool.drain()
+            # Unfinished sessions keep their journals for the next start
+            for journal in list(self.journals.values()):
+                await journal.flush()
+            await self.credentials.stop()
+            if self.http is not None:
+                await self.http.close()
+                self.http = None
 
     async def handle_client(self, websocket):
         """Handle a new WebSocket client connection"""
         client_id = id(websocket)
         logger.info(f"New client connected: {client_id}")
 
+        # All outbound messages for this client go through one writer task
+        sender = ClientSender(websocket)
+        sender.start()
+
         # Send ready message to client
-        await websocket.send(json.dumps({"type": "ready"}))
+        sender.send_control({"type": "ready"})
 
         try:
             # Start the audio processing for this client
-            await self.process_audio(websocket, client_id)
+            await self.process_audio(websocket, client_id, sender)
         except ConnectionClosed:
             logger.info(f"Client disconnected: {client_id}")
         except Exception as e:
             logger.error(f"Error handling client {client_id}: {e}")
             logger.error(traceback.format_exc())
         finally:
-            # Summarize and clean up on disconnect
+            # Hand the transcript to the summarization workers and clean up on disconnect
             logger.info(f"Cleaning up connection for client {client_id}")
-            uid = self.user_ids.get(client_id)
-            if uid and self.session_transcripts.get(client_id):
-                logger.info(f"Connection closed for UID {uid}. Summarizing transcript.")
-                try:
-                    await self.summarize_and_store(client_id, uid)
-                except Exception as e:
-                    logger.error(f"Error during cleanup summarization for client {client_id}: {e}")
+            state = self.summary_states.pop(client_id, None)
+            if state is not None:
+                state.sender = None  # nobody left to send summary progress to
+                # The journal stays registered (and flushed) until finish_session retires it
+                self._spawn(self.finish_session(state, state.transcript.journal))
 
             # Clean up dictionaries
             if client_id in self.active_clients:
@@ -280,33 +2169,189 @@ class LiveAPIWebSocketServer:
                 del self.session_ids[client_id]
             if client_id in self.user_ids:
                 del self.user_ids[client_id]
+            if client_id in self.session_start_times:
+                del self.session_start_times[client_id]
+            await sender.close()
 
-    async def _fetch_with_timeout(self, url, method="GET", json_data=None, timeout=8.0):
-        """Helper method for HTTP requests with better timeout handling."""
+    def _spawn(self, coro):
+        """Run `coro` in the background, keeping a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def request_summary(self, state: SessionSummaryState, checkpoint=False):
+        """
+        Summarize the part of the session's transcript not covered yet and return the
+        latest result. Callers arriving while a segment is in flight wait on that job.
+
+        A checkpoint folds the new turns into the session's running summary without
+        saving it, so the final summary only has to cover the last stretch.
+        """
+        while state.inflight is not None or state.detail is not None:
+            await asyncio.shield(state.inflight or state.detail)
+
+        # Close the current turn so later fragments are not merged into the snapshot
+        state.transcript.seal()
+        start, end = state.watermark, len(state.transcript)
+        # A final request with nothing new still has to save what checkpoints folded in
+        if start >= end and (checkpoint or not state.unsaved):
+            return state.result or "skipped"
+
+        job = SummaryJob(
+            state.client_id,
+            state.uid,
+            state.transcript[start:end],
+            session_handle=state.session_handle,
+            started_at=state.started_at,
+            ended_at=state.ended_at,
+            checkpoint=checkpoint,
+            running_summary=state.running_summary,
+            sender=state.sender,
+            context=state.context,
+            baseline_text=state.baseline_text,
+        )
+        state.watermark = end
+        state.last_summary_at = time.monotonic()
+        state.inflight = asyncio.ensure_future(self._run_summary_job(state, job, start, end))
+        return await asyncio.shield(state.inflight)
+
+    async def _run_summary_job(self, state, job, start, end):
+        result = None
         try:
-            loop = asyncio.get_event_loop()
-            if method.upper() == "GET":
-                response = await asyncio.wait_for(
-                    loop.run_in_executor(
-                        None, 
-                        lambda: requests.get(url, timeout=timeout)
-                    ),
-                    timeout=timeout + 2.0
-                )
+            result = await (await self.summary_pool.submit(job))
+        except Exception as e:
+            logger.error(f"Error summarizing session for UID {state.uid}: {e}")
+        finally:
+            state.inflight = None
+            # Loaded before anything of this session was saved; later segments reuse it
+            if state.baseline_text is None:
+                state.baseline_text = job.baseline_text
+            if result is None:
+                # Let a later trigger retry this segment
+                state.watermark = min(state.watermark, start)
             else:
-                response = await asyncio.wait_for(
-                    loop.run_in_executor(
-                        None, 
-                        lambda: requests.post(url, json=json_data, timeout=timeout)
-                    ),
-                    timeout=timeout + 2.0
-                )
-            
-            if response.status_code == 200:
-                return response.json()
+                if job.summary is not None:
+                    state.running_summary = job.summary
+                state.unsaved = job.checkpoint
+                if not job.checkpoint:
+                    state.result = result
+                # Summarized turns are no longer needed in memory
+                state.transcript.release(end)
+                if state.transcript.journal is not None:
+                    state.transcript.journal.record({
+                        "op": "summarized", "upto": end, "summary": job.summary, "saved": not job.checkpoint,
+                    })
+                if SUMMARY_TWO_STAGE and job.transcript and not job.checkpoint:
+                    state.detail = self._spawn(self._run_detail_job(state, job, end))
+        return result
+
+    async def _run_detail_job(self, state, job, end):
+        """Second stage of a final summary: the full plan pass, updating the saved record."""
+        detail = SummaryJob(
+            job.client_id,
+            job.uid,
+            job.transcript,
+            session_handle=job.session_handle,
+            started_at=job.started_at,
+            ended_at=job.ended_at,
+            running_summary=job.running_summary,
+            detail=True,
+            summary_id=job.summary_id,
+            sender=job.sender,
+            context=job.context,
+            baseline_text=job.baseline_text,
+        )
+        result = None
+        try:
+            result = await (await self.summary_pool.submit(detail))
+        except Exception as e:
+            logger.error(f"Error in detailed summary for UID {state.uid}: {e}")
+        finally:
+            state.detail = None
+        if result is None:
+            logger.error(f"Detailed summary for UID {state.uid} failed; the metrics-only record stays")
+            return
+        state.running_summary = detail.summary
+        if state.transcript.journal is not None:
+            state.transcript.journal.record({"op": "summarized", "upto": end, "summary": detail.summary, "saved": True})
+
+    async def summarize_on_end(self, state, sender):
+        """Summarize on the client's "end" signal and report the outcome with summary_saved."""
+        try:
+            result = await self.request_summary(state)
+            data = result or "error: summarization failed"
+        except Exception as e:
+            logger.error(f"Summarization error: {e}")
+            data = f"error: {e}"
+        sender.send_control({
+            "type": "summary_saved",
+            "data": data
+        })
+
+    async def finish_session(self, state, journal=None):
+        """Summarize whatever is left of a closed session, then retire its journal."""
+        if state.status != "done":
+            logger.info(f"Connection closed for UID {state.uid}. Queueing transcript for summarization.")
+            await self.request_summary(state)
+        while state.detail is not None:
+            await asyncio.shield(state.detail)
+        if journal is not None:
+            self.journals.pop(journal.path, None)
+            if state.status == "done":
+                await journal.discard()
             else:
-                logger.warning(f"HTTP {response.status_code} from {url}")
-                return None
+                # Keep it for the recovery pass on the next start
+                await journal.flush()
+
+    async def recover_journals(self, paths):
+        """Summarize sessions whose journals were left behind by a previous run."""
+        for path in paths:
+            try:
+                state = await asyncio.to_thread(TranscriptJournal.replay, path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Unreadable transcript journal {path}: {e}")
+                continue
+            if state is None:
+                await TranscriptJournal(path).discard()
+                continue
+            logger.info(f"Recovering transcript journal for UID {state.uid}: {os.path.basename(path)}")
+            journal = TranscriptJournal(path)
+            state.transcript.journal = journal
+            self.journals[path] = journal
+            await self.finish_session(state, journal)
+
+    async def _flush_journals(self):
+        while True:
+            await asyncio.sleep(TRANSCRIPT_JOURNAL_FLUSH_SECONDS)
+            for journal in list(self.journals.values()):
+                await journal.flush()
+
+    def _http_session(self):
+        """Return the shared keep-alive session used for all Node.js backend calls."""
+        if self.http is None or self.http.closed:
+            self.http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=BACKEND_HTTP_POOL_SIZE,
+                    keepalive_timeout=BACKEND_HTTP_KEEPALIVE_SECONDS,
+                )
+            )
+        return self.http
+
+    async def _fetch_with_timeout(self, url, method="GET", json_data=None, timeout=8.0):
+        """Helper method for HTTP requests with better timeout handling."""
+        try:
+            async with self._http_session().request(
+                method.upper(),
+                url,
+                json=json_data if method.upper() != "GET" else None,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as response:
+                if response.status == 200:
+                    return await response.json(content_type=None)
+                else:
+                    logger.warning(f"HTTP {response.status} from {url}")
+                    return None
                 
         except asyncio.TimeoutError:
             logger.error(f"Request timeout for {url} after {timeout}s")
@@ -315,17 +2360,35 @@ class LiveAPIWebSocketServer:
             logger.error(f"Request failed for {url}: {e}")
             return None
 
-    async def generate_dynamic_system_instruction(self, uid: str) -> str:
+    async def load_user_context(self, uid: str) -> UserContext:
+        """
+        Returns the user's connect-time context: the dynamic system instruction and the
+        previous summary snapshot, served from the per-UID context cache when possible
+        (see ContextCache).
+        """
+        if not uid:
+            logger.warning("No UID provided, using default system instruction.")
+            return UserContext(SYSTEM_INSTRUCTION)
+
+        # Taken before the build: a save racing with it makes the snapshot stale
+        version = self.context_cache.version(uid)
+        context = await self.context_cache.get_or_build(uid, self._build_user_context)
+        if context is None:
+            # Without a snapshot summarization fetches the previous summary itself
+            return UserContext(SYSTEM_INSTRUCTION, version=version)
+        # Not part of the cached text, which can be served for a long time
+        now = datetime.now(timezone.utc).strftime("%b %d, %Y, %I:%M %p UTC")
+        return UserContext(f"{context.instruction}\nCurrent date and time: {now}", context.previous_summary, version)
+
+    async def _build_user_context(self, uid: str):
         """
         Generates a dynamic system instruction based on user data from the database.
-        Uses unified context system: 7-day recent summaries + historical archives
+        Uses unified context system: 7-day recent summaries + historical archives.
+        Returns a UserContext with the instruction and the /get-summary snapshot, or
+        None if the user context could not be loaded.
         """
         total_start = datetime.now()
         logger.info(f"🚀 Starting dynamic instruction generation for UID: {uid}")
-        
-        if not uid:
-            logger.warning("No UID provided, using default system instruction.")
-            return SYSTEM_INSTRUCTION
 
         try:
             # 1. Fetch user data from the Node.js server
@@ -335,13 +2398,15 @@ class LiveAPIWebSocketServer:
             )
             if not user_data:
                 logger.error(f"Failed to fetch user data for UID {uid}.")
-                return SYSTEM_INSTRUCTION
+                return None
 
             user_name = user_data.get("name", "there")
-            latest_summary = user_data.get("latestSummary", {}).get("summary_data", {})
+            # latestSummary is null for users without an active plan
+            latest_summary = (user_data.get("latestSummary") or {}).get("summary_data") or {}
 
             # 2. Make parallel requests for context data
-            recent_context_response, weekly_archives_response, user_profile_response = await asyncio.gather(
+            (recent_context_response, weekly_archives_response, user_profile_response,
+             summary_response) = await asyncio.gather(
                 self._fetch_with_timeout(
                     "http://localhost:3000/get-recent-context", 
                     method="POST", 
@@ -356,6 +2421,11 @@ class LiveAPIWebSocketServer:
                     f"http://localhost:3000/user-profile/{uid}",
                     timeout=8.0
                 ),
+                # The summarization baseline, cached with the instruction (see UserContext)
+                self._fetch_with_timeout(
+                    f"http://localhost:3000/get-summary/{uid}",
+                    timeout=BACKEND_TIMEOUT_SECONDS
+                ),
                 return_exceptions=True
             )
 
@@ -373,20 +2443,15 @@ class LiveAPIWebSocketServer:
                         timestamp = summary.get("timestamp")
                         source = summary.get("source", "unknown")
                         
-                        # Calculate days ago
-                        days_ago = "recent"
+                        # Absolute dates only: this text is cached and may be served on a
+                        # later day; the current date is added per session (see load_user_context)
                         date_str = "Unknown date"
                         if timestamp:
                             try:
                                 summary_date = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                                days_diff = (datetime.now(summary_date.tzinfo) - summary_date).days
-                                if days_diff == 0:
-                                    days_ago = "Today"
-                                elif days_diff == 1:
-                                    days_ago = "Yesterday"
-                                else:
-                                    days_ago = f"{days_diff} days ago"
-                                date_str = summary_date.strftime("%b %d, %I:%M %p")
+                                if summary_date.tzinfo is not None:
+                                    summary_date = summary_date.astimezone(timezone.utc)
+                                date_str = summary_date.strftime("%b %d, %Y, %I:%M %p UTC")
                             except:
                                 pass
                         
@@ -394,7 +2459,7 @@ class LiveAPIWebSocketServer:
                         icon = "🎙️" if source == "ai_session" else "📔"
                         source_label = "AI Coaching Session" if source == "ai_session" else "Fitness Log"
                         
-                        recent_activity += f"{icon} {date_str} ({days_ago}) - {source_label}\n"
+                        recent_activity += f"{icon} {date_str} - {source_label}\n"
                         
                         # Add source-specific details for fitness context
                         if source == "journal_entry":
@@ -592,7 +2657,7 @@ class LiveAPIWebSocketServer:
                 
                 try:
                     question_model = pick_summarizer_model(MODEL)
-                    question_response = await client.aio.models.generate_content(
+                    question_response = await self.credentials.client.aio.models.generate_content(
                         model=question_model,
                         contents=[question_prompt],
                         config=types.GenerateContentConfig(temperature=0.7)
@@ -665,33 +2730,48 @@ class LiveAPIWebSocketServer:
             
             if total_time > 10.0:
                 logger.warning(f"⚠️  Slow generation detected: {total_time:.2f}s - encryption may be causing delays")
-            
-            return dynamic_instruction
+
+            # A failed fetch leaves summarization to fetch the previous summary itself
+            previous_summary = None
+            if summary_response and not isinstance(summary_response, Exception):
+                previous_summary = summary_snapshot_text(summary_response)
+            return UserContext(dynamic_instruction, previous_summary)
 
         except Exception as e:
             total_time = (datetime.now() - total_start).total_seconds()
             logger.error(f"❌ Dynamic instruction generation failed after {total_time:.2f}s: {e}")
             logger.error(traceback.format_exc())
-            return SYSTEM_INSTRUCTION
+            return None
 
-    async def process_audio(self, websocket, client_id):
+    async def process_audio(self, websocket, client_id, sender):
         # Store reference to client
         self.active_clients[client_id] = websocket
 
-        # Init transcript buffer for this client
-        self.session_transcripts[client_id] = []
-        
         # NEW: Record session start time for duration calculation
         self.session_start_times[client_id] = datetime.now()
 
+        # Init transcript buffer for this client
+        self.session_transcripts[client_id] = SessionTranscript()
+
         # Wait for the initial user_id message before starting the session (with increased timeout)
         uid = None
         try:
             message = await asyncio.wait_for(websocket.recv(), timeout=30.0)  # Increased timeout
-            data = json.loads(message)
+            data = json_codec.loads(message)
             if data.get("type") == "user_id":
                 uid = data.get("data")
                 self.user_ids[client_id] = uid
+                audio_options = ClientAudioOptions.from_message(data)
+                state = SessionSummaryState(
+                    client_id, uid, self.session_transcripts[client_id],
+                    started_at=self.session_start_times[client_id],
+                )
+                state.sender = sender
+                self.summary_states[client_id] = state
+                if TRANSCRIPT_JOURNAL_ENABLED:
+                    journal = TranscriptJournal.create(TRANSCRIPT_JOURNAL_DIR, state)
+                    state.transcript.journal = journal
+                    self.journals[journal.path] = journal
                 logger.info(f"Received user ID: {uid}")
             else:
                 logger.error("First message from client was not 'user_id'. Closing connection.")
@@ -705,34 +2785,36 @@ class LiveAPIWebSocketServer:
             logger.error(f"Error receiving user_id from client: {e}")
             return # Connection is likely already closed or message was malformed
 
-        # Send status update to client
-        try:
-            await websocket.send(json.dumps({
-                "type": "status",
-                "data": "Preparing your personalized AI companion..."
-            }))
-        except Exception:
-            pass
+        # Confirm the negotiated audio settings, then send status update to client
+        sender.configure(audio_options)
+        sender.send_control({
+            "type": "audio_config",
+            "data": audio_options.describe()
+        })
+        sender.send_control({
+            "type": "status",
+            "data": "Preparing your personalized AI companion..."
+        })
 
         # Generate dynamic system instruction using the received UID
         logger.info(f"⏳ Generating dynamic system instruction for UID: {uid}")
         try:
-            dynamic_system_instruction = await asyncio.wait_for(
-                self.generate_dynamic_system_instruction(uid),
+            user_context = await asyncio.wait_for(
+                self.load_user_context(uid),
                 timeout=25.0  # Overall timeout for instruction generation
             )
+            dynamic_system_instruction = user_context.instruction
+            # Summarization reuses the snapshot instead of fetching it again
+            state.context = user_context
         except asyncio.TimeoutError:
             logger.error("🚨 Dynamic instruction generation timed out - using fallback")
             dynamic_system_instruction = SYSTEM_INSTRUCTION + "\n\nWelcome back! How's your fitness journey going?"
 
         # Send status update to client
-        try:
-            await websocket.send(json.dumps({
-                "type": "status",
-                "data": "Connecting to AI service..."
-            }))
-        except Exception:
-            pass
+        sender.send_control({
+            "type": "status",
+            "data": "Connecting to AI service..."
+        })
 
         # Create a new LiveAPI Config for this session with the dynamic instruction
         logger.info(f"⏳ Creating LiveAPI config for session...")
@@ -751,78 +2833,23 @@ class LiveAPIWebSocketServer:
         )
         logger.info(f"✅ LiveAPI config created")
 
-        # 🔥 CRITICAL FIX: Refresh authentication before connecting to LiveAPI
+        # Make sure the shared client has a valid token (normally a no-op; refreshed in the background)
         logger.info(f"⏳ Connecting to Gemini LiveAPI (model: {MODEL})...")
         auth_start = datetime.now()
-        
-        global client, creds
-        
         try:
-            logger.info("🔄 Refreshing authentication credentials...")
-            
-            # Log current token state
-            if creds.expiry:
-                import datetime as dt
-                time_left = (creds.expiry - dt.datetime.utcnow()).total_seconds()
-                logger.info(f"📊 Current token age: {time_left:.0f}s remaining")
-            
-            # Method 1: Refresh existing credentials (fastest)
-            creds.refresh(Request())
-            
-            # Recreate client with refreshed credentials
-            client = genai.Client(
-                vertexai=True,
-                project=PROJECT_ID,
-                location=LOCATION,
-                credentials=creds,
-            )
-            
-            auth_time = (datetime.now() - auth_start).total_seconds()
-            expiry_time = creds.expiry.strftime("%H:%M:%S") if creds.expiry else "unknown"
-            logger.info(f"✅ Token refreshed in {auth_time:.2f}s (expires at: {expiry_time})")
-            
+            client = await self.credentials.ensure_fresh()
         except Exception as auth_error:
-            logger.error(f"❌ Token refresh failed: {auth_error}")
+            logger.error(f"❌ All authentication attempts failed: {auth_error}")
+            logger.error(traceback.format_exc())
             
-            # Method 2: Recreate credentials from file (slower but more thorough)
-            try:
-                logger.info("🔄 Fallback: Recreating credentials from service account file...")
-                
-                creds = service_account.Credentials.from_service_account_file(
-                    KEY_PATH, 
-                    scopes=SCOPES
-                )
-                
-                # Force immediate token fetch
-                creds.refresh(Request())
-                
-                # Recreate client
-                client = genai.Client(
-                    vertexai=True,
-                    project=PROJECT_ID,
-                    location=LOCATION,
-                    credentials=creds,
-                )
-                
-                auth_time = (datetime.now() - auth_start).total_seconds()
-                expiry_time = creds.expiry.strftime("%H:%M:%S") if creds.expiry else "unknown"
-                logger.info(f"✅ Fallback successful in {auth_time:.2f}s (expires at: {expiry_time})")
-                
-            except Exception as fallback_error:
-                logger.error(f"❌ All authentication attempts failed: {fallback_error}")
-                logger.error(traceback.format_exc())
-                
-                # Send error to client
-                try:
-                    await websocket.send(json.dumps({
-                        "type": "error",
-                        "data": f"Authentication failed: Unable to connect to AI service. Please try again."
-                    }))
-                except Exception as send_error:
-                    logger.error(f"Failed to send error message to client: {send_error}")
-                
-                # Don't proceed to LiveAPI connection
-                return
+            # Send error to client
+            sender.send_control({
+                "type": "error",
+                "data": f"Authentication failed: Unable to connect to AI service. Please try again."
+            })
+            
+            # Don't proceed to LiveAPI connection
+            return
 
         # NOW connect to LiveAPI with fresh token
         logger.info(f"⏳ Attempting LiveAPI connection with fresh credentials...")
@@ -832,62 +2859,47 @@ class LiveAPIWebSocketServer:
                 logger.info(f"✅ Successfully connected to Gemini LiveAPI! (total time: {connect_time:.2f}s)")
                 
                 # Send success status to client
-                try:
-                    await websocket.send(json.dumps({
-                        "type": "status",
-                        "data": "AI companion ready! You can start talking now."
-                    }))
-                except Exception:
-                    pass
+                sender.send_control({
+                    "type": "status",
+                    "data": "AI companion ready! You can start talking now."
+                })
                 
                 async with asyncio.TaskGroup() as tg:
-                    # Create a queue for audio data from the client
-                    audio_queue = asyncio.Queue()
+                    # Bounded queue for audio data from the client
+                    audio_queue = AudioInbox()
 
                     # Task to process incoming WebSocket messages (audio, text, end)
                     async def handle_websocket_messages():
                         async for message in websocket:
                             try:
-                                data = json.loads(message)
+                                if isinstance(message, bytes):
+                                    # Binary frame: header + raw PCM, no JSON/base64 decoding
+                                    codec, _turn_id, _rate, payload = unpack_audio_frame(message)
+                                    await audio_queue.put(decode_client_audio(codec, payload))
+                                    continue
+                                data = json_codec.loads(message)
                                 if data.get("type") == "audio":
-                                    audio_bytes = base64.b64decode(data.get("data", ""))
+                                    audio_bytes = decode_client_audio(
+                                        audio_options.codec, base64.b64decode(data.get("data", ""))
+                                    )
                                     await audio_queue.put(audio_bytes)
                                 elif data.get("type") == "end":
                                     logger.info("Received end signal from client")
+                                    await audio_queue.put(AUDIO_FLUSH)
                                     # Summarize on demand when client signals end
-                                    try:
-                                        uid = self.user_ids.get(client_id)
-                                        if not uid:
-                                            logger.error("No user ID found for client")
-                                            continue
-                                        
-                                        saved_path = await self.summarize_and_store(client_id, uid)
-                                        try:
-                                            await websocket.send(json.dumps({
-                                                "type": "summary_saved",
-                                                "data": saved_path or "ok"
-                                            }))
-                                        except Exception as se:
-                                            logger.error(f"Error sending summary_saved over WS: {se}")
-                                    except Exception as e:
-                                        logger.error(f"Summarization error: {e}")
-                                        try:
-                                            await websocket.send(json.dumps({
-                                                "type": "summary_saved",
-                                                "data": f"error: {e}"
-                                            }))
-                                        except Exception as se:
-                                            logger.error(f"Error sending error over WS: {se}")
+                                    state = self.summary_states.get(client_id)
+                                    if state is None:
+                                        logger.error("No user ID found for client")
+                                        continue
+                                    # In the background, so this loop keeps reading client messages
+                                    self._spawn(self.summarize_on_end(state, sender))
                                 elif data.get("type") == "text":
                                     txt = data.get("data")
                                     logger.info(f"Received text: {txt}")
                                     # Record explicit text messages from client as user turns
                                     if txt:
-                                        self.session_transcripts[client_id].append({
-                                            "role": "user",
-                                            "text": txt,
-                                            "ts": datetime.now(timezone.utc).isoformat()
-                                        })
+                                        await audio_queue.put(AUDIO_FLUSH)
+                                        self.session_transcripts[client_id].append("user", txt, new_turn=True)
                                         # Corrected method to send text content
                                         await session.send_realtime_input(text=txt)
                                 elif data.get("type") == "user_id":
@@ -898,17 +2910,63 @@ class LiveAPIWebSocketServer:
                             except Exception as e:
                                 logger.error(f"Error processing message: {e}")
 
-                    # Task to process and send audio to Gemini
+                    # Task to coalesce client audio into fixed-size frames and send them to Gemini
                     async def process_and_send_audio():
-                        while True:
-                            data = await audio_queue.get()
-                            await session.send_realtime_input(
-                                media={
-                                    "data": data,
-                                    "mime_type": f"audio/pcm;rate={SEND_SAMPLE_RATE}",
-                                }
-                            )
-                            audio_queue.task_done()
+                        aggregator = AudioAggregator()
+                        vad = EnergyVAD() if audio_options.vad else None
+                        resampler = None
+                        if audio_options.input_rate != SEND_SAMPLE_RATE:
+                            resampler = PolyphaseResampler(audio_options.input_rate, SEND_SAMPLE_RATE)
+
+                        async def send_frame(frame):
+                            frames = [frame]
+                            if vad is not None:
+                                frames, event = vad.process(frame)
+                                if event == "speech_end":
+                                    # Silence is no longer streamed; let the model close the turn
+                                    await session.send_realtime_input(audio_stream_end=True)
+                                if event:
+                                    sender.send_control({"type": "vad", "data": event})
+                            for out in frames:
+                                await session.send_realtime_input(
+                                    media={
+                                        "data": out,
+                                        "mime_type": f"audio/pcm;rate={SEND_SAMPLE_RATE}",
+                                    }
+                                )
+
+                        get_task = None
+                        try:
+                            while True:
+                                if get_task is None:
+                                    get_task = asyncio.ensure_future(audio_queue.get())
+                                # Don't hold a partial frame back once the client goes quiet
+                                timeout = aggregator.frame_seconds if aggregator.pending else None
+                                done, _ = await asyncio.wait({get_task}, timeout=timeout)
+                                if not done:
+                                    frame = aggregator.flush()
+                                    if frame:
+                                        await send_frame(frame)
+                                    continue
+
+                                data, get_task = get_task.result(), None
+                                if data is AUDIO_FLUSH:
+                                    frames = [aggregator.flush()]
+                                else:
+                                    if resampler is not None:
+                                        data = resampler.process(data)
+                                    frames = aggregator.push(data)
+                                for frame in frames:
+                                    if frame:
+                                        await send_frame(frame)
+                        finally:
+                            if get_task is not None:
+                                get_task.cancel()
+                            if audio_queue.dropped_chunks:
+                                logger.info(
+                                    f"📉 Client {client_id} dropped {audio_queue.dropped_chunks} audio chunks "
+                                    f"({audio_queue.dropped_bytes} bytes) this session"
+                                )
 
                     # Task to receive and play responses
                     async def receive_and_play():
@@ -924,14 +2982,15 @@ class LiveAPIWebSocketServer:
                                         logger.info(f"New SESSION: {session_id}")
                                         # Keep latest handle per client
                                         self.session_ids[client_id] = session_id
+                                        state = self.summary_states.get(client_id)
+                                        if state is not None:
+                                            state.session_handle = session_id
+                                            if state.transcript.journal is not None:
+                                                state.transcript.journal.record({"op": "handle", "id": session_id})
 
-                                        session_id_msg = json.dumps({
+                                        sender.send_control({
                                             "type": "session_id", "data": session_id
                                         })
-                                        try:
-                                            await websocket.send(session_id_msg)
-                                        except Exception as se:
-                                            logger.error(f"Error sending session_id over WS: {se}")
 
                                 if response.go_away is not None:
                                     logger.info(f"Session will terminate in: {response.go_away.time_left}")
@@ -940,31 +2999,24 @@ class LiveAPIWebSocketServer:
 
                                 if (hasattr(server_content, "interrupted") and server_content.interrupted):
                                     logger.info("🤐 INTERRUPTION DETECTED")
-                                    try:
-                                        await websocket.send(json.dumps({
-                                            "type": "interrupted",
-                                            "data": "Response interrupted by user input"
-                                        }))
-                                    except Exception as se:
-                                        logger.error(f"Error sending interrupted over WS: {se}")
+                                    # Drop the rest of this turn's audio before it reaches the client
+                                    interrupted_turn = sender.interrupt()
+                                    sender.send_control({
+                                        "type": "interrupted",
+                                        "data": "Response interrupted by user input",
+                                        "turn": interrupted_turn,
+                                    })
 
                                 if server_content and server_content.model_turn:
                                     for part in server_content.model_turn.parts:
                                         if part.inline_data:
-                                            b64_audio = base64.b64encode(part.inline_data.data).decode('utf-8')
-                                            try:
-                                                await websocket.send(json.dumps({
-                                                    "type": "audio", "data": b64_audio
-                                                }))
-                                            except Exception as se:
-                                                logger.error(f"Error sending audio over WS: {se}")
+                                            rate = mime_sample_rate(part.inline_data.mime_type, RECEIVE_SAMPLE_RATE)
+                                            sender.send_audio(part.inline_data.data, rate)
 
                                 if server_content and server_content.turn_complete:
                                     logger.info("✅ Gemini done talking")
-                                    try:
-                                        await websocket.send(json.dumps({ "type": "turn_complete" }))
-                                    except Exception as se:
-                                        logger.error(f"Error sending turn_complete over WS: {se}")
+                                    # Ordered behind the turn's audio so the client doesn't end the turn early
+                                    sender.send_ordered({ "type": "turn_complete", "turn": sender.next_turn() })
 
                                 output_transcription = getattr(response.server_content, "output_transcription", None)
                                 if output_transcription and output_transcription.text:
@@ -979,33 +3031,27 @@ class LiveAPIWebSocketServer:
                                     except Exception as e:
                                         logger.error(f"Error processing model output: {e}")
 
-                                    try:
-                                        await websocket.send(json.dumps({
-                                            "type": "text", "data": text_out
-                                        }))
-                                    except Exception as se:
-                                        logger.error(f"Error sending text over WS: {se}")
-                                    # Record assistant outputs
-                                    self.session_transcripts[client_id].append({
-                                        "role": "assistant",
-                                        "text": text_out,
-                                        "ts": datetime.now(timezone.utc).isoformat()
+                                    sender.send_text({
+                                        "type": "text", "data": text_out
                                     })
+                                    # Record assistant outputs
+                                    self.session_transcripts[client_id].append("assistant", text_out)
 
                                 input_transcription = getattr(response.server_content, "input_transcription", None)
                                 if input_transcription and input_transcription.text:
                                     text_in = input_transcription.text
                                     input_transcriptions.append(text_in)
                                     # Record user recognized speech
-                                    self.session_transcripts[client_id].append({
-                                        "role": "user",
-                                        "text": text_in,
-                                        "ts": datetime.now(timezone.utc).isoformat()
-                                    })
+                                    self.session_transcripts[client_id].append("user", text_in)
 
                             logger.info(f"Output transcription: {''.join(output_transcriptions)}")
                             logger.info(f"Input transcription: {''.join(input_transcriptions)}")
 
+                            # Fold long sessions into a running summary between turns
+                            state = self.summary_states.get(client_id)
+                            if state is not None and state.checkpoint_due():
+                                self._spawn(self.request_summary(state, checkpoint=True))
+
                     # Start all tasks
                     tg.create_task(handle_websocket_messages())
                     tg.create_task(process_and_send_audio())
@@ -1014,249 +3060,295 @@ class LiveAPIWebSocketServer:
             logger.error(f"❌ Gemini LiveAPI connection failed: {gemini_error}")
             logger.error(traceback.format_exc())
             # Send error to client
-            try:
-                await websocket.send(json.dumps({
-                    "type": "error",
-                    "data": f"Failed to connect to AI service: {str(gemini_error)}"
-                }))
-            except Exception as send_error:
-                logger.error(f"Failed to send error message to client: {send_error}")
+            sender.send_control({
+                "type": "error",
+                "data": f"Failed to connect to AI service: {str(gemini_error)}"
+            })
             raise  # Re-raise to trigger cleanup in handle_client
 
     # ---------- Summarize & store function ----------
-    async def summarize_and_store(self, client_id: str, uid: str):
+    async def summarize_and_store(self, job: SummaryJob):
         """
-        Summarizes the full transcript for a client and sends it to the Node.js backend.
+        Summarizes the transcript snapshot in `job` and sends it to the Node.js backend.
+        Checkpoint jobs only fold the snapshot into the running summary (job.summary).
+        With SUMMARY_TWO_STAGE, final jobs run the fast metrics pass and save it; the
+        full pass follows as a separate `detail` job updating the same record.
+        Returns "ok" (or "checkpoint", or "skipped" when there is nothing to summarize)
+        on success and None on failure. The worker pool retries on None; steps that
+        already succeeded are recorded on the job and not repeated by the retry.
         """
-        transcript = self.session_transcripts.get(client_id, [])
+        uid = job.uid
+        transcript = job.transcript
         if not transcript:
-            logger.info("No transcript found; skipping summary.")
-            return None
+            if job.running_summary is None:
+                logger.info("No transcript found; skipping summary.")
+                return "skipped"
+            # Checkpoints already covered every turn; only the save is left
+            job.summary = job.running_summary
+            return await self._save_summary(job, job.summary, "full")
 
         # Extract user's name from the first user message
         user_name = None
-        for message in transcript:
-            if message.get("role") == "user":
+        for turn in transcript:
+            if turn.role == "user":
                 # This is a simple heuristic to find the name.
                 # A more robust solution would use named entity recognition.
-                text = message.get("text", "").lower()
+                text = turn.text.lower()
                 if "my name is" in text:
-                    user_name = text.split("my name is")[-1].strip()
+                    user_name = text.split("my name is")[-1]
+                    # Turns hold whole utterances, so stop at the end of the clause
+                    for sep in ".,!?\n":
+                        user_name = user_name.split(sep)[0]
+                    user_name = user_name.strip() or None
                     break
         
-        if user_name:
-            try:
-                requests.post("http://localhost:3000/backend/save-name", json={"uid": uid, "name": user_name})
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Error saving user name: {e}")
-
-        # Fetch previous summary
-        previous_summary = ""
-        try:
-            response = requests.get(f"http://localhost:3000/get-summary/{uid}")
-            if response.status_code == 200:
-                previous_summary = response.json().get("latestSummary", {}).get("summary_data", {}).get("summary", "")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching previous summary: {e}")
+        # The first stage (or an earlier attempt) already saved it
+        if user_name and not (job.detail or job.name_saved):
+            saved = await self._fetch_with_timeout(
+                "http://localhost:3000/backend/save-name",
+                method="POST",
+                json_data={"uid": uid, "name": user_name},
+                timeout=BACKEND_TIMEOUT_SECONDS,
+            )
+            if saved is None:
+                logger.error(f"Error saving user name for UID {uid}")
+            job.name_saved = saved is not None
+
+        # The last summary from before this session is the baseline for progress over
+        # time; later segments of the session also fold into its running summary
+        if job.baseline_text is None:
+            context = job.context
+            if (context is not None and context.previous_summary is not None
+                    and context.version == self.context_cache.version(uid)):
+                # Nothing was saved for this user since connect time, so the snapshot is current
+                job.baseline_text = context.previous_summary
+            else:
+                summary_response = await self._fetch_with_timeout(
+                    f"http://localhost:3000/get-summary/{uid}",
+                    timeout=BACKEND_TIMEOUT_SECONDS,
+                )
+                job.baseline_text = summary_snapshot_text(summary_response)
+        previous_summary = job.baseline_text
+        running_summary = ""
+        if job.running_summary is not None:
+            running_summary = json.dumps(job.running_summary, ensure_ascii=False, separators=(",", ":"))
 
         # Prepare a compact transcript string (role: text)
-        flat_lines = []
-        for turn in transcript:
-            role = turn.get("role", "user")
-            text = turn.get("text", "").strip()
-            if text:
-                flat_lines.append(f"{role.upper()}: {text}")
-        flat_transcript = "\n".join(flat_lines)
-
-        session_handle = self.session_ids.get(client_id)
-
-        # Instruction to produce STRICT JSON (no medical diagnoses)
-        system_note = (
-            "You are GenX AI, a supportive, expert fitness coach. "
-            "Summarize the user's full conversation in a fitness coaching context. "
-            "You must NOT provide any medical diagnosis or treatment for injuries. "
-            "Detect safety concerns (injuries, pain, unsafe practices) and reflect them as flags only. "
-            "Return STRICT JSON only—no markdown, no code fences, no extra text."
+        flat_transcript = SessionTranscript.flatten(transcript)
+
+        if SUMMARY_TWO_STAGE and not (job.checkpoint or job.detail):
+            stage = "metrics"
+        else:
+            stage = "detail" if job.detail else "full"
+
+        # A retry after a failed save posts the summary generated by the earlier attempt
+        if job.summary is None:
+            if stage == "metrics":
+                job.summary = await self._generate_metrics_summary(
+                    job, previous_summary, running_summary, flat_transcript
+                )
+            else:
+                job.summary = await self._generate_full_summary(
+                    job, previous_summary, running_summary, flat_transcript
+                )
+        summary_obj = job.summary
+        if job.checkpoint:
+            logger.info(f"Checkpoint summary for UID {uid} folded in {len(transcript)} turn(s)")
+            return "checkpoint"
+        return await self._save_summary(job, summary_obj, stage)
+
+    async def _generate_metrics_summary(self, job: SummaryJob, previous_summary: str, running_summary: str,
+                                        flat_transcript: str) -> dict:
+        """
+        Fast first pass of a final summary: headline metrics and risk flags only.
+        Plans and other fields carry over from the session's running summary.
+        """
+        user_prompt = f"{build_summary_context(previous_summary, running_summary)}TRANSCRIPT:\n{flat_transcript}"
+        gen = await asyncio.wait_for(
+            self.credentials.client.aio.models.generate_content(
+                model=pick_summarizer_model(MODEL),
+                contents=[types.Content(role="user", parts=[
+                    types.Part(text=SUMMARY_METRICS_PROMPT_PREFIX),
+                    types.Part(text=user_prompt),
+                ])],
+                config=types.GenerateContentConfig(
+                    temperature=0.2,
+                    max_output_tokens=SUMMARY_FAST_MAX_OUTPUT_TOKENS,
+                    system_instruction=SUMMARY_METRICS_SYSTEM_NOTE,
+                    response_mime_type="application/json",
+                    response_schema=SUMMARY_METRICS_SCHEMA,
+                )
+            ),
+            timeout=SUMMARY_MODEL_TIMEOUT_SECONDS,
         )
+        metrics = parse_summary(response_text(gen), normalize_summary_metrics)
+        self._push_progress(job, "metrics", metrics)
+        logger.info(f"Fast metrics pass for UID {job.uid}: {json.dumps(metrics)}")
 
-        # JSON schema for fitness plan (matching convex/plan.ts structure)
-        schema_hint = {
-            "session_id": session_handle or "",
-            "generated_at_utc": datetime.now(timezone.utc).isoformat(),
-            "language": "auto",
-            "summary": "",
-            "main_points": [],
-            "fitness_topics_discussed": [],  # e.g., ["strength training", "nutrition", "cardio"]
-            "goals_or_hopes": [],
-            "action_items_suggested": [],
-            "progress_analysis": "",
-            
-            # Fitness Progress Metrics
-            "energy_level": 0,  # 0-100 scale (workout energy and vitality)
-            "recovery_quality": None,  # e.g., "Well Rested", "Sore", "Fatigued"
-            "workout_adherence": None,  # e.g., "Consistent", "Inconsistent", "Improving"
-            "motivation_level": 0,  # 0-100 scale
-            "form_quality_notes": None,  # Notes on exercise form discussed
-            
-            # Nutrition Tracking
-            "nutrition_compliance": None,  # e.g., "On Track", "Needs Improvement"
-            "hydration_level": None,  # e.g., "Well Hydrated", "Needs Improvement"
-            "meal_timing_notes": None,  # Notes on meal timing around workouts
-            
-            # Physical Metrics
-            "sleep_quality": None,  # e.g., "Rested", "Okay", "Poor"
-            "sleep_duration_hours": None,  # numeric hours slept
-            
-            # Workout Plan (if discussed/created during session)
-            "workoutPlan": {
-                "schedule": [],  # e.g., ["Monday", "Wednesday", "Friday"]
-                "exercises": []  # Array of {day, routines: [{name, sets, reps}]}
-            },
-            
-            # Nutrition Plan (if discussed/created during session)
-            "nutritionPlan": {
-                "dailyCalories": 0,  # Must be NUMBER
-                "meals": []  # Array of {name, foods: []}
-            },
-            
-            # Safety Flags
-            "risk_flags": {
-                "mentions_injury_pain": False,
-                "unsafe_training_practices": False,
-                "extreme_diet_mentioned": False,
-                "medical_consultation_recommended": False
-            },
-            
-            # Coaching Notes
-            "suggestions": [],  # Non-medical coaching suggestions
-            
-            # Training Focus Areas (confidence 0.0-1.0)
-            "training_focus_areas": [
-                {"name": "strength_training", "confidence": 0.0},
-                {"name": "cardiovascular_fitness", "confidence": 0.0},
-                {"name": "flexibility_mobility", "confidence": 0.0}
-            ]
-        }
+        summary_obj = merge_summary_fields(job.running_summary, metrics)
+        summary_obj["session_id"] = job.session_handle or ""
+        summary_obj["generated_at_utc"] = datetime.now(timezone.utc).isoformat()
+        return summary_obj
 
-        user_prompt = (
-            "Analyze the following fitness coaching conversation transcript and combine it with the previous summary to create an updated summary. "
-            "The updated summary should reflect the user's fitness progress and current training state. "
-            "Focus on fitness goals, workout adherence, nutrition compliance, and progress discussed. "
-            "If a previous summary is provided, analyze the user's fitness progress over time in the 'progress_analysis' field. "
-            "Infer language if not explicit. "
-            
-            "IMPORTANT - Fitness Metrics Analysis: "
-            "- 'energy_level' on a 0-100 scale representing workout energy and vitality. "
-            "- 'motivation_level' on a 0-100 scale representing training motivation. "
-            "- 'recovery_quality' as a descriptor (e.g., Well Rested, Sore, Fatigued). "
-            "- 'workout_adherence' describing training consistency (e.g., Consistent, Inconsistent, Improving). "
-            "- 'nutrition_compliance' describing diet adherence (e.g., On Track, Needs Improvement). "
-            "- 'form_quality_notes' capturing any exercise form discussions or corrections. "
-            
-            "Sleep and Recovery: "
-            "- 'sleep_quality' as a descriptor (Rested/Okay/Poor) and 'sleep_duration_hours' as numeric value. "
-            "- 'hydration_level' describing hydration status. "
-            "- 'meal_timing_notes' capturing meal timing around workouts if discussed. "
-            
-            "Workout and Nutrition Plans: "
-            "- If a workout plan was discussed/created, populate 'workoutPlan' with 'schedule' array and 'exercises' array. "
-            "- Each exercise must have 'day', and 'routines' array with objects containing 'name', 'sets' (NUMBER), 'reps' (NUMBER). "
-            "- If a nutrition plan was discussed/created, populate 'nutritionPlan' with 'dailyCalories' (NUMBER) and 'meals' array. "
-            "- Each meal must have 'name' and 'foods' array with food items as strings. "
-            
-            "Safety Flags: "
-            "- 'mentions_injury_pain': true if user mentions pain or injury. "
-            "- 'unsafe_training_practices': true if dangerous exercise practices discussed. "
-            "- 'extreme_diet_mentioned': true if extreme or unhealthy diet practices mentioned. "
-            "- 'medical_consultation_recommended': true if medical consultation should be recommended. "
-            
-            "Training Focus Areas: "
-            "Identify which training areas were emphasized in the session (strength_training, cardiovascular_fitness, flexibility_mobility, "
-            "nutrition_planning, injury_prevention, form_technique, progressive_overload, recovery_strategies). "
-            "Assign confidence scores (0.0-1.0) for each area. Only include areas with confidence > 0.6. "
-            
-            "If information is not provided, set the corresponding field to null. "
-            "For workout and nutrition plans, only populate if explicitly discussed - otherwise leave as empty arrays. "
-            "Fill the provided JSON schema faithfully and only return the JSON object.\n\n"
-            f"PREVIOUS_SUMMARY:\n{previous_summary}\n\n"
-            f"JSON_SCHEMA_EXAMPLE:\n{json.dumps(schema_hint, ensure_ascii=False, indent=2)}\n\n"
-            f"TRANSCRIPT:\n{flat_transcript}"
+    async def _generate_full_summary(self, job: SummaryJob, previous_summary: str, running_summary: str,
+                                     flat_transcript: str) -> dict:
+        """Full summary pass: metrics, plans, progress analysis and focus areas."""
+        user_prompt = build_summary_suffix(
+            job.session_handle or "",
+            datetime.now(timezone.utc).isoformat(),
+            previous_summary,
+            flat_transcript,
+            running_summary,
         )
 
-
         # Pick a compatible model for generateContent (avoids INVALID_ARGUMENT)
         summarizer_model = pick_summarizer_model(MODEL)
         if summarizer_model != MODEL:
             logger.info(f"Using summarizer model '{summarizer_model}' for generateContent (from '{MODEL}')")
 
-        # Build Content/Part properly
-        user_content = types.Content(
-            role="user",
-            parts=[types.Part(text=user_prompt)]
-        )
-
-        # Call the text model
-        gen = await client.aio.models.generate_content(
-            model=summarizer_model,
-            contents=[user_content],  # could also pass contents=user_prompt (string)
-            config=types.GenerateContentConfig(
-                temperature=0.3,
-                system_instruction=system_note,
-                response_mime_type="application/json"
-            )
+        # The static prefix comes from the model-side cache when there is one,
+        # otherwise it is sent inline ahead of the per-session suffix
+        cache_name = await self.prefix_cache.get(summarizer_model)
+        config = types.GenerateContentConfig(
+            temperature=0.3,
+            response_mime_type="application/json",
+            response_schema=SUMMARY_RESPONSE_SCHEMA,
         )
-
-        # Extract text safely
-        text = ""
-        if gen and getattr(gen, "candidates", None):
-            for c in gen.candidates:
-                if getattr(c, "content", None) and getattr(c.content, "parts", None):
-                    for p in c.content.parts:
-                        if getattr(p, "text", None):
-                            text += p.text
+        if cache_name:
+            config.cached_content = cache_name
+            parts = [types.Part(text=user_prompt)]
+        else:
+            config.system_instruction = SUMMARY_SYSTEM_NOTE
+            parts = [types.Part(text=SUMMARY_PROMPT_PREFIX), types.Part(text=user_prompt)]
+        user_content = types.Content(role="user", parts=parts)
+
+        # Call the text model; checkpoints are internal, so only user-facing passes stream
+        try:
+            if SUMMARY_STREAMING_ENABLED and not job.checkpoint:
+                text = await asyncio.wait_for(
+                    self._stream_summary(job, summarizer_model, [user_content], config),
+                    timeout=SUMMARY_MODEL_TIMEOUT_SECONDS,
+                )
+            else:
+                gen = await asyncio.wait_for(
+                    self.credentials.client.aio.models.generate_content(
+                        model=summarizer_model,
+                        contents=[user_content],
+                        config=config,
+                    ),
+                    timeout=SUMMARY_MODEL_TIMEOUT_SECONDS,
+                )
+                text = response_text(gen)
+        except Exception as e:
+            if cache_name and self.prefix_cache.is_cache_error(e):
+                # The retry sends the prefix inline; timeouts and quota errors keep the cache
+                self.prefix_cache.invalidate()
+            raise
 
         logger.info(f"Raw AI response: {text}")
-        summary_obj = extract_json(text) if text else {"raw": ""}
-        
-        # Validate and correct mood scores
-        summary_obj = validate_mood_scores(summary_obj)
+        # Raises on malformed output so the job is retried instead of saving it
+        summary_obj = parse_summary(text)
         logger.info(f"Parsed and validated summary object: {json.dumps(summary_obj, indent=2)}")
+        return summary_obj
+
+    async def _stream_summary(self, job: SummaryJob, model, contents, config) -> str:
+        """
+        Stream the full summary pass and return its text. Top-level fields are pushed
+        to the client as soon as they complete; in a single-stage summary the metrics
+        are also saved once they have all arrived, ahead of the plans. (With two stages
+        the metrics stage has already saved them, so the detail pass does not.)
+        """
+        stage = "detail" if job.detail else "full"
+        fields = JsonFieldStream()
+        completed = {}
+        pieces = []
+        early_save = None
+        try:
+            stream = await self.credentials.client.aio.models.generate_content_stream(
+                model=model, contents=contents, config=config,
+            )
+            async for chunk in stream:
+                piece = response_text(chunk)
+                if not piece:
+                    continue
+                pieces.append(piece)
+                new_fields = {
+                    name: SUMMARY_FIELD_NORMALIZERS[name](value)
+                    for name, value in fields.feed(piece)
+                    if name in SUMMARY_FIELD_NORMALIZERS
+                }
+                if not new_fields:
+                    continue
+                completed.update(new_fields)
+                self._push_progress(job, stage, new_fields)
+                if early_save is None and not job.detail and SUMMARY_METRICS_FIELDS <= completed.keys():
+                    metrics = merge_summary_fields(
+                        job.running_summary, {name: completed[name] for name in SUMMARY_METRICS_FIELDS}
+                    )
+                    early_save = asyncio.ensure_future(self._save_summary(job, metrics, "metrics"))
+        finally:
+            # The final save must not be overtaken by the early one
+            if early_save is not None:
+                await early_save
+        return "".join(pieces)
+
+    def _push_progress(self, job: SummaryJob, stage: str, fields: dict):
+        """Send completed summary fields to the session's client while it is connected."""
+        if job.sender is not None and job.sender.closed:
+            job.sender = None  # the client is gone; let the sender be collected
+        if job.sender is not None:
+            job.sender.send_control({
+                "type": "summary_progress",
+                "summary_id": job.summary_id,
+                "stage": stage,
+                "data": fields,
+            })
+
+    async def _save_summary(self, job: SummaryJob, summary_obj: dict, stage: str):
+        """
+        Post a session summary to the Node.js backend. Every stage of one summary uses
+        the job's summary_id, so later stages update the record the first one created.
+        """
+        uid = job.uid
+        session_handle = job.session_handle
 
         # NEW: Calculate session duration
         session_duration_minutes = 0
-        if client_id in self.session_start_times:
-            session_end_time = datetime.now()
-            session_start_time = self.session_start_times[client_id]
-            duration_seconds = (session_end_time - session_start_time).total_seconds()
+        if job.started_at:
+            duration_seconds = (job.ended_at - job.started_at).total_seconds()
             session_duration_minutes = round(duration_seconds / 60, 2)  # Convert to minutes
             logger.info(f"📊 Session duration: {session_duration_minutes} minutes")
 
         # Send to Node.js backend
-        try:
-            payload = {
-                "uid": uid,
-                "summary": {
-                    "summary_data": summary_obj,
-                    "meta": {
-                        "client_id": client_id,
-                        "session_id": session_handle,
-                        "saved_at_utc": datetime.now(timezone.utc).isoformat(),
-                        "duration_minutes": session_duration_minutes  # NEW: Include duration
-                    }
+        payload = {
+            "uid": uid,
+            "summary": {
+                "summary_data": summary_obj,
+                "meta": {
+                    "client_id": job.client_id,
+                    "session_id": session_handle,
+                    "summary_id": job.summary_id,
+                    "stage": stage,
+                    "saved_at_utc": datetime.now(timezone.utc).isoformat(),
+                    "duration_minutes": session_duration_minutes  # NEW: Include duration
                 }
             }
-            response = requests.post("http://localhost:3000/backend/save-plan", json=payload)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            logger.info(f"✅ Fitness plan sent to Node.js backend: {response.text}")
-            
-            # NEW: Clean up session start time after sending summary
-            if client_id in self.session_start_times:
-                del self.session_start_times[client_id]
-            
-            return "ok"
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error sending summary to Node.js backend: {e}")
+        }
+        result = await self._fetch_with_timeout(
+            "http://localhost:3000/backend/save-plan",
+            method="POST",
+            json_data=payload,
+            timeout=BACKEND_TIMEOUT_SECONDS,
+        )
+        if result is None:
+            logger.error(f"Error sending summary to Node.js backend for UID {uid}")
             return None
+        logger.info(f"✅ Fitness plan ({stage}) sent to Node.js backend: {result}")
+
+        # The cached connect-time context no longer reflects the latest plan
+        self.context_cache.invalidate(uid)
+
+        return "ok"
 
 
 async def main():
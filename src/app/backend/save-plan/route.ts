@@ -51,12 +51,24 @@ export async function POST(request: Request) {
       workout_adherence: summaryData.workout_adherence || '',
       recovery_quality: summaryData.recovery_quality || '',
       training_focus_areas: summaryData.training_focus_areas || [],
+      risk_flags: summaryData.risk_flags || {},
       workoutPlan: workoutPlan,
       nutritionPlan: nutritionPlan,
+      summary_stage: meta?.stage || 'full',
     };
     
-    await saveSessionSummary(uid, sessionData);
-    console.log(`[Backend] ✅ Session summary saved: ${meta?.session_id}`);
+    // Stages of a two-stage summary share summary_id and update one record
+    await saveSessionSummary(uid, sessionData, meta?.summary_id);
+    console.log(`[Backend] ✅ Session summary saved: ${meta?.session_id} (${sessionData.summary_stage})`);
+    
+    // The detailed stage follows and carries the plans
+    if (meta?.stage === 'metrics') {
+      return NextResponse.json({
+        success: true,
+        message: 'Session metrics saved',
+        sessionId: meta?.session_id
+      });
+    }
     
     // Check if there's COMPLETE plan data to save in plans collection
     const hasWorkoutData = workoutPlan.schedule?.length > 0 && workoutPlan.exercises?.length > 0;
@@ -161,12 +161,31 @@ export async function getActivePlan(userId: string): Promise<FitnessPlan | null>
 }
 
 /**
- * Save session summary to Firestore
+ * Save session summary to Firestore.
+ * With a summaryId the record is upserted, so later summary stages update it in place.
  */
-export async function saveSessionSummary(userId: string, sessionData: Record<string, unknown>) {
-  await adminDb.collection('users').doc(userId).collection('sessions').add({
-    ...sessionData,
-    createdAt: admin.firestore.FieldValue.serverTimestamp(),
+export async function saveSessionSummary(
+  userId: string,
+  sessionData: Record<string, unknown>,
+  summaryId?: string
+) {
+  const sessions = adminDb.collection('users').doc(userId).collection('sessions');
+  if (!summaryId) {
+    await sessions.add({
+      ...sessionData,
+      createdAt: admin.firestore.FieldValue.serverTimestamp(),
+    });
+    return;
+  }
+
+  const ref = sessions.doc(summaryId);
+  await adminDb.runTransaction(async (tx) => {
+    const existing = await tx.get(ref);
+    tx.set(ref, {
+      ...sessionData,
+      ...(existing.exists ? {} : { createdAt: admin.firestore.FieldValue.serverTimestamp() }),
+      updatedAt: admin.firestore.FieldValue.serverTimestamp(),
+    }, { merge: true });
   });
 }
 
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# server.py and json_codec.py live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import LiveAPIWebSocketServer, UserContext, normalize_summary, summary_snapshot_text  # noqa: E402
+
+
+def make_summary(**fields):
+    """Schema-valid summary object (every field of SUMMARY_RESPONSE_SCHEMA) with `fields` set."""
+    return normalize_summary(fields)
+
+
+class FakeBackend:
+    """
+    Stands in for the Node.js backend and the summarizer model of a server:
+    records every request and prompt, and answers from the attributes below.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.requests = []                 # URLs, in request order
+        self.latest_summary = make_summary(summary="Last week: squats 3x8.")  # /get-summary data (None: no summary)
+        self.summary_available = True      # False makes /get-summary fail
+        self.instruction = "Coach the user."
+        self.summary = make_summary(summary="Leg day went well.", energy_level=70)  # what the model returns
+        self.generate_errors = []          # raised by the next model calls, in order
+        self.generate_delay = 0.0
+        self.prompts = []                  # (previous_summary, running_summary, transcript) per model call
+        self.save_results = []             # results of the next saves (default "ok"; None fails the save)
+        self.saved = []                    # (stage, summary_obj, summary_id) per successful save
+        server._fetch_with_timeout = self.fetch
+        server._build_user_context = self.build_context
+        server._generate_metrics_summary = self.generate
+        server._generate_full_summary = self.generate
+        server._save_summary = self.save
+
+    def count(self, path):
+        return sum(path in url for url in self.requests)
+
+    async def fetch(self, url, method="GET", json_data=None, timeout=None):
+        self.requests.append(url)
+        if "/get-summary/" in url:
+            if not self.summary_available:
+                return None
+            return {"latestSummary": {"summary_data": self.latest_summary} if self.latest_summary else None}
+        return {"ok": True}
+
+    async def build_context(self, uid):
+        self.requests.append(f"build:{uid}")
+        summary_response = await self.fetch(f"http://localhost:3000/get-summary/{uid}")
+        previous_summary = summary_snapshot_text(summary_response) if summary_response else None
+        return UserContext(f"{self.instruction} ({uid})", previous_summary)
+
+    async def generate(self, job, previous_summary, running_summary, flat_transcript):
+        self.prompts.append((previous_summary, running_summary, flat_transcript))
+        if self.generate_delay:
+            await asyncio.sleep(self.generate_delay)
+        if self.generate_errors:
+            raise self.generate_errors.pop(0)
+        return dict(self.summary)
+
+    async def save(self, job, summary_obj, stage):
+        result = self.save_results.pop(0) if self.save_results else "ok"
+        if result is not None:
+            self.saved.append((stage, summary_obj, job.summary_id))
+        return result
+
+
+@pytest.fixture
+def server():
+    return LiveAPIWebSocketServer()
+
+
+@pytest.fixture
+def backend(server):
+    return FakeBackend(server)
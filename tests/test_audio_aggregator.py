@@ -0,0 +1,53 @@
+from server import AudioAggregator
+
+
+def make_aggregator():
+    # 1000 Hz * 4 ms = 4 samples, 8 bytes per frame
+    return AudioAggregator(sample_rate=1000, frame_ms=4)
+
+
+def test_small_chunks_are_coalesced_into_whole_frames():
+    agg = make_aggregator()
+    assert agg.push(b"\x01\x00" * 3) == []
+    frames = agg.push(b"\x02\x00" * 3)
+    assert frames == [b"\x01\x00" * 3 + b"\x02\x00"]
+    assert agg.pending == 4
+
+
+def test_large_chunk_is_split_into_several_frames():
+    agg = make_aggregator()
+    data = bytes(range(20))
+    frames = agg.push(data)
+    assert frames == [data[0:8], data[8:16]]
+    assert agg.flush() == data[16:20]
+    assert agg.pending == 0
+
+
+def test_flush_keeps_a_dangling_half_sample():
+    agg = make_aggregator()
+    agg.push(b"\x01\x02\x03")
+    assert agg.flush() == b"\x01\x02"
+    assert agg.pending == 1
+    frames = agg.push(b"\x04" + b"\x00" * 7)
+    assert frames == [b"\x03\x04" + b"\x00" * 6]
+
+
+def test_flush_with_nothing_buffered_returns_none():
+    agg = make_aggregator()
+    assert agg.flush() is None
+    agg.push(b"\x01")
+    assert agg.flush() is None
+
+
+def test_frames_do_not_alias_the_internal_buffer():
+    agg = make_aggregator()
+    first = agg.push(b"\x01" * 8)[0]
+    agg.push(b"\x02" * 8)
+    assert first == b"\x01" * 8
+
+
+def test_memoryview_input_is_accepted():
+    agg = make_aggregator()
+    source = bytearray(b"\x05" * 10)
+    frames = agg.push(memoryview(source)[:8])
+    assert frames == [b"\x05" * 8]
@@ -0,0 +1,111 @@
+import warnings
+
+import numpy as np
+import pytest
+
+import server
+from server import (
+    ClientAudioOptions, ClientSender, ImaAdpcmEncoder, decode_ima_adpcm, decode_mulaw, encode_mulaw,
+    unpack_audio_frame,
+)
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+requires_audioop = pytest.mark.skipif(audioop is None, reason="audioop not available")
+
+
+def speech_like(n=4001, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / 16000
+    wave = 6000 * np.sin(2 * np.pi * 220 * t) + 2000 * np.sin(2 * np.pi * 1330 * t)
+    return (wave + rng.normal(0, 300, n)).astype("<i2").tobytes()
+
+
+ALL_SAMPLES = np.arange(-32768, 32768, dtype="<i2").tobytes()
+
+
+@requires_audioop
+def test_mulaw_matches_audioop_for_every_sample():
+    assert encode_mulaw(ALL_SAMPLES) == audioop.lin2ulaw(ALL_SAMPLES, 2)
+    codes = bytes(range(256))
+    assert decode_mulaw(codes) == audioop.ulaw2lin(codes, 2)
+
+
+def test_mulaw_roundtrip_error_is_bounded():
+    pcm = np.frombuffer(speech_like(), dtype="<i2").astype(np.int32)
+    decoded = np.frombuffer(decode_mulaw(encode_mulaw(speech_like())), dtype="<i2").astype(np.int32)
+    # Quantization step grows with amplitude: within 1/16 of the value (plus the smallest step)
+    assert np.all(np.abs(decoded - pcm) <= np.abs(pcm) / 16 + 8)
+
+
+def test_adpcm_roundtrip_tracks_the_signal():
+    pcm = speech_like(n=4000)
+    decoded = decode_ima_adpcm(ImaAdpcmEncoder().encode(pcm))
+    original = np.frombuffer(pcm, dtype="<i2").astype(np.float64)
+    restored = np.frombuffer(decoded, dtype="<i2").astype(np.float64)
+    snr = 10 * np.log10(np.sum(original ** 2) / np.sum((original - restored) ** 2))
+    assert len(decoded) == len(pcm)
+    assert snr > 20
+
+
+def test_adpcm_odd_chunks_carry_the_last_sample():
+    pcm = speech_like(n=4000)
+    whole = decode_ima_adpcm(ImaAdpcmEncoder().encode(pcm))
+    encoder = ImaAdpcmEncoder()
+    blocks = [encoder.encode(pcm[i:i + 602]) for i in range(0, len(pcm), 602)]  # 301 samples each
+    assert encoder.flush() == b""
+    assert b"".join(decode_ima_adpcm(block) for block in blocks) == whole
+
+
+def test_adpcm_flush_emits_the_carried_sample():
+    encoder = ImaAdpcmEncoder()
+    block = encoder.encode(speech_like(n=301))
+    assert len(decode_ima_adpcm(block)) == 300 * 2
+    tail = decode_ima_adpcm(encoder.flush())
+    assert len(tail) == 2 * 2
+    assert encoder.flush() == b""
+
+
+def test_adpcm_reset_drops_the_carried_sample():
+    encoder = ImaAdpcmEncoder()
+    encoder.encode(speech_like(n=3))
+    encoder.reset()
+    assert encoder.flush() == b""
+
+
+def test_adpcm_rejects_a_corrupt_step_index():
+    with pytest.raises(ValueError):
+        decode_ima_adpcm(b"\x00\x00\x59\x00\x12")
+
+
+def test_sender_flushes_the_carried_sample_before_turn_complete():
+    sender = ClientSender(websocket=None)
+    sender.configure(ClientAudioOptions(binary=True, codec="ima_adpcm", paced=False, adaptive=False))
+    sender.send_audio(speech_like(n=301), 24000)
+    sender.send_ordered({"type": "turn_complete", "turn": sender.next_turn()})
+    messages = []
+    while True:
+        message, _ = sender._next_message()
+        if message is None:
+            break
+        messages.append(message)
+    assert len(messages) == 3
+    samples = [len(decode_ima_adpcm(unpack_audio_frame(m)[3])) // 2 for m in messages[:2]]
+    assert samples == [300, 2]
+    assert unpack_audio_frame(messages[1])[1] == 0
+    assert "turn_complete" in messages[2]
+
+
+@requires_audioop
+def test_python_adpcm_fallback_matches_audioop(monkeypatch):
+    pcm = speech_like(n=2000)
+    reference = ImaAdpcmEncoder().encode(pcm)
+    monkeypatch.setattr(server, "audioop", None)
+    fallback = ImaAdpcmEncoder().encode(pcm)
+    assert fallback == reference
+    assert decode_ima_adpcm(fallback) == audioop.adpcm2lin(reference[4:], 2, (0, 0))[0]
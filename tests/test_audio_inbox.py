@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from server import AUDIO_FLUSH, AudioInbox
+
+
+def test_drop_oldest_discards_the_oldest_chunk_when_full():
+    async def run():
+        inbox = AudioInbox(maxsize=2, latency_budget_ms=10_000, policy="drop_oldest")
+        for chunk in (b"a", b"bb", b"ccc"):
+            await inbox.put(chunk)
+        return [await inbox.get(), await inbox.get()], inbox
+    items, inbox = asyncio.run(run())
+    assert items == [b"bb", b"ccc"]
+    assert (inbox.dropped_chunks, inbox.dropped_bytes) == (1, 1)
+
+
+def test_drop_oldest_keeps_flush_markers():
+    async def run():
+        inbox = AudioInbox(maxsize=3, latency_budget_ms=10_000, policy="drop_oldest")
+        for item in (AUDIO_FLUSH, b"a", AUDIO_FLUSH, b"bb"):
+            await inbox.put(item)
+        return [await inbox.get() for _ in range(3)], inbox
+    items, inbox = asyncio.run(run())
+    assert items == [AUDIO_FLUSH, AUDIO_FLUSH, b"bb"]
+    assert (inbox.dropped_chunks, inbox.dropped_bytes) == (1, 1)
+
+
+def test_backpressure_makes_put_wait_for_room():
+    async def run():
+        inbox = AudioInbox(maxsize=1, latency_budget_ms=10_000, policy="backpressure")
+        await inbox.put(b"a")
+        blocked = asyncio.ensure_future(inbox.put(b"b"))
+        await asyncio.sleep(0.01)
+        was_blocked = not blocked.done()
+        first = await inbox.get()
+        await blocked
+        return was_blocked, first, await inbox.get(), inbox.dropped_chunks
+    assert asyncio.run(run()) == (True, b"a", b"b", 0)
+
+
+def test_get_drops_chunks_over_the_latency_budget():
+    async def run():
+        inbox = AudioInbox(maxsize=10, latency_budget_ms=5)
+        await inbox.put(b"late")
+        await asyncio.sleep(0.02)
+        await inbox.put(b"fresh")
+        return await inbox.get(), inbox
+    item, inbox = asyncio.run(run())
+    assert item == b"fresh"
+    assert (inbox.dropped_chunks, inbox.dropped_bytes) == (1, 4)
+
+
+def test_flush_marker_is_never_dropped_for_latency():
+    async def run():
+        inbox = AudioInbox(maxsize=10, latency_budget_ms=5)
+        await inbox.put(AUDIO_FLUSH)
+        await asyncio.sleep(0.02)
+        return await inbox.get(), inbox.dropped_chunks
+    assert asyncio.run(run()) == (AUDIO_FLUSH, 0)
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        AudioInbox(policy="drop_newest")
@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import json
+
+import pytest
+from websockets.exceptions import ConnectionClosedOK
+
+import server
+from server import ClientAudioOptions, ClientSender
+
+
+class FakeWebSocket:
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.fail_after = fail_after
+
+    async def send(self, message):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise ConnectionClosedOK(None, None)
+        self.sent.append(message)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
+
+
+def make_sender(websocket=None, paced=False, **kwargs):
+    sender = ClientSender(websocket, **kwargs)
+    sender.configure(ClientAudioOptions(paced=paced, adaptive=False))
+    return sender
+
+
+def paced_sender(chunks=16):
+    # 125 ms lead and 1/32 s chunks at 16 kHz keep the fake clock arithmetic exact
+    sender = make_sender(paced=True, pacing_lead_ms=125)
+    for _ in range(chunks):
+        sender.send_audio(b"\x00" * 1000, 16000)
+    return sender
+
+
+def release(sender):
+    """Seconds of audio the writer sends before pacing holds it back."""
+    released = 0.0
+    while sender._pacing_delay() <= 0:
+        message, seconds = sender._next_message()
+        if message is None:
+            break
+        released += seconds
+    return released
+
+
+def drain(sender):
+    messages = []
+    while True:
+        message, _ = sender._next_message()
+        if message is None:
+            return [json.loads(m) for m in messages]
+        messages.append(message)
+
+
+def test_control_goes_before_text_before_audio():
+    sender = make_sender()
+    sender.send_audio(b"\x00\x00", 24000)
+    sender.send_text({"type": "text", "data": "hi"})
+    sender.send_control({"type": "status", "data": "ready"})
+    assert [m["type"] for m in drain(sender)] == ["status", "text", "audio"]
+
+
+def test_consecutive_audio_chunks_are_coalesced():
+    sender = make_sender()
+    for _ in range(3):
+        sender.send_audio(b"\x01\x00" * 10, 24000)
+    sender.send_ordered({"type": "turn_complete", "turn": sender.next_turn()})
+    sender.send_audio(b"\x02\x00" * 10, 24000)
+    messages = drain(sender)
+    assert [m["type"] for m in messages] == ["audio", "turn_complete", "audio"]
+    assert [m["turn"] for m in messages] == [0, 0, 1]
+    assert base64.b64decode(messages[0]["data"]) == b"\x01\x00" * 30
+
+
+def test_audio_over_budget_drops_the_oldest_chunks():
+    sender = make_sender(audio_budget=8)
+    for n in range(3):
+        sender.send_audio(bytes([n]) * 4, 24000)
+    assert sender.dropped_audio_bytes == 4
+    assert sender._audio_bytes == 8
+    assert [item[0] for item in sender._audio] == [b"\x01" * 4, b"\x02" * 4]
+
+
+def test_interrupt_discards_queued_audio_but_keeps_ordered_messages():
+    sender = make_sender()
+    sender.send_audio(b"\x00" * 8, 24000)
+    sender.send_ordered({"type": "turn_complete", "turn": 0})
+    interrupted = sender.interrupt()
+    sender.send_audio(b"\x00" * 8, 24000)
+    messages = drain(sender)
+    assert interrupted == 0
+    assert sender.flushed_audio_bytes == 8
+    assert [(m["type"], m["turn"]) for m in messages] == [("turn_complete", 0), ("audio", 1)]
+
+
+def test_writer_sends_everything_then_close_returns():
+    async def run():
+        ws = FakeWebSocket()
+        sender = make_sender(ws)
+        sender.start()
+        sender.send_control({"type": "status", "data": "ready"})
+        sender.send_audio(b"\x00\x00", 24000)
+        await sender.close(timeout=1)
+        return ws.sent
+    assert [json.loads(m)["type"] for m in asyncio.run(run())] == ["status", "audio"]
+
+
+def test_closed_connection_stops_the_writer_and_further_sends():
+    async def run():
+        ws = FakeWebSocket(fail_after=0)
+        sender = make_sender(ws)
+        sender.start()
+        sender.send_control({"type": "status", "data": "ready"})
+        await asyncio.sleep(0.01)
+        sender.send_audio(b"\x00\x00", 24000)
+        sender.send_control({"type": "status", "data": "late"})
+        return sender._closed, len(sender._audio), len(sender._control)
+    assert asyncio.run(run()) == (True, 0, 0)
+
+
+def test_turn_complete_after_interrupt_ends_the_interrupted_turn():
+    sender = make_sender()
+    sender.send_audio(b"\x00" * 8, 24000)
+    interrupted = sender.interrupt()
+    completed = sender.next_turn()
+    sender.send_audio(b"\x00" * 8, 24000)
+    assert (interrupted, completed) == (0, 0)
+    assert sender.turn_id == 1
+    assert [m["turn"] for m in drain(sender)] == [1]
+
+
+def test_repeated_interrupts_end_the_turn_once():
+    sender = make_sender()
+    assert (sender.interrupt(), sender.interrupt()) == (0, 0)
+    assert sender.turn_id == 1
+
+
+def test_audio_after_interrupt_starts_a_turn_that_completes_normally():
+    sender = make_sender()
+    sender.interrupt()
+    sender.send_audio(b"\x00" * 8, 24000)
+    assert sender.next_turn() == 1
+    assert sender.turn_id == 2
+
+
+def test_close_releases_the_socket_and_queued_audio():
+    async def run():
+        sender = make_sender(FakeWebSocket(fail_after=0))
+        sender.start()
+        sender.send_control({"type": "status", "data": "ready"})
+        sender.send_audio(b"\x00" * 8, 24000)
+        await sender.close(timeout=0.01)
+        return sender
+    sender = asyncio.run(run())
+    assert sender.closed
+    assert sender.websocket is None
+    assert not sender._audio and sender._audio_bytes == 0
+
+
+def test_pacing_allows_a_burst_of_twice_the_lead(clock):
+    sender = paced_sender()
+    # The first message fills the lead; the second is released as soon as the first starts playing
+    assert release(sender) == 0.25
+    assert sender._pacing_delay() == 0.125
+
+
+def test_paced_audio_then_flows_at_playback_rate(clock):
+    sender = paced_sender()
+    release(sender)
+    released = []
+    for _ in range(2):
+        clock.now += sender._pacing_delay()
+        released.append(release(sender))
+    assert released == [0.125, 0.125]
+    assert sender._play_clock - clock.now == 0.25
+
+
+def test_pacing_never_holds_back_control_messages(clock):
+    sender = paced_sender()
+    release(sender)
+    sender.send_control({"type": "status", "data": "ready"})
+    assert sender._pacing_delay() == 0
+    assert json.loads(sender._next_message()[0])["type"] == "status"
+
+
+def test_interrupt_resets_pacing(clock):
+    sender = paced_sender()
+    release(sender)
+    sender.interrupt()
+    sender.send_audio(b"\x00" * 4000, 16000)
+    assert sender._pacing_delay() <= 0
+    assert release(sender) == 0.125
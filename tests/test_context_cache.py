@@ -0,0 +1,157 @@
+import asyncio
+
+from conftest import make_summary
+from server import ContextCache, LiveAPIWebSocketServer
+
+
+def make_builder(values=None, delay=0.0):
+    calls = []
+
+    async def build(uid):
+        calls.append(uid)
+        await asyncio.sleep(delay)
+        return (values or {}).get(uid, f"ctx-{uid}-{len(calls)}")
+    return build, calls
+
+
+def test_miss_builds_once_for_concurrent_callers():
+    async def run():
+        cache = ContextCache()
+        build, calls = make_builder(delay=0.01)
+        results = await asyncio.gather(*(cache.get_or_build("u1", build) for _ in range(5)))
+        return results, calls
+    results, calls = asyncio.run(run())
+    assert results == ["ctx-u1-1"] * 5
+    assert calls == ["u1"]
+
+
+def test_fresh_entry_is_served_without_rebuilding():
+    async def run():
+        cache = ContextCache(ttl=60, stale_ttl=120)
+        build, calls = make_builder()
+        first = await cache.get_or_build("u1", build)
+        second = await cache.get_or_build("u1", build)
+        return first, second, calls
+    first, second, calls = asyncio.run(run())
+    assert first == second == "ctx-u1-1"
+    assert len(calls) == 1
+
+
+def test_stale_entry_is_served_and_refreshed_in_background():
+    async def run():
+        cache = ContextCache(ttl=0, stale_ttl=60)
+        build, calls = make_builder()
+        await cache.get_or_build("u1", build)
+        await asyncio.sleep(0.001)
+        stale = await cache.get_or_build("u1", build)
+        await asyncio.sleep(0.01)  # let the background refresh finish
+        refreshed = cache._entries["u1"][1]
+        return stale, refreshed, calls
+    stale, refreshed, calls = asyncio.run(run())
+    assert stale == "ctx-u1-1"
+    assert refreshed == "ctx-u1-2"
+    assert len(calls) == 2
+
+
+def test_expired_entry_is_rebuilt_before_returning():
+    async def run():
+        cache = ContextCache(ttl=0, stale_ttl=0)
+        build, _ = make_builder()
+        await cache.get_or_build("u1", build)
+        await asyncio.sleep(0.001)
+        return await cache.get_or_build("u1", build)
+    assert asyncio.run(run()) == "ctx-u1-2"
+
+
+def test_invalidate_bumps_version_and_discards_running_build():
+    async def run():
+        cache = ContextCache()
+        build, _ = make_builder(delay=0.02)
+        pending = asyncio.ensure_future(cache.get_or_build("u1", build))
+        await asyncio.sleep(0.005)
+        cache.invalidate("u1")
+        value = await pending
+        return cache, value
+    cache, value = asyncio.run(run())
+    assert value == "ctx-u1-1"          # the caller still gets its result
+    assert "u1" not in cache._entries   # but it is not cached
+    assert cache.version("u1") == 1
+    assert cache.version("other") == 0
+
+
+def test_failed_builds_are_not_cached():
+    async def run():
+        cache = ContextCache()
+
+        async def failing(uid):
+            raise RuntimeError("backend down")
+
+        async def empty(uid):
+            return None
+        return await cache.get_or_build("u1", failing), await cache.get_or_build("u1", empty), cache
+    failed, empty, cache = asyncio.run(run())
+    assert failed is None and empty is None
+    assert not cache._entries
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def run():
+        cache = ContextCache(max_entries=2)
+        build, _ = make_builder()
+        for uid in ("a", "b"):
+            await cache.get_or_build(uid, build)
+        await cache.get_or_build("a", build)  # touch a
+        await cache.get_or_build("c", build)
+        return list(cache._entries)
+    assert asyncio.run(run()) == ["a", "c"]
+
+
+def test_snapshot_is_the_get_summary_text(server, backend):
+    backend.latest_summary["summary"] = "Squats went well."
+    context = asyncio.run(server.load_user_context("u1"))
+    assert context.instruction.startswith("Coach the user. (u1)\nCurrent date and time: ")
+    assert context.previous_summary == "Squats went well."
+    assert backend.count("/get-summary/u1") == 1
+
+
+def test_snapshot_without_summary_text_is_empty(server, backend):
+    backend.latest_summary = None
+    assert asyncio.run(server.load_user_context("u1")).previous_summary == ""
+    backend.latest_summary = make_summary()
+    assert asyncio.run(server.load_user_context("u2")).previous_summary == ""
+
+
+def test_failed_snapshot_is_left_to_summarization(server, backend):
+    backend.summary_available = False
+    assert asyncio.run(server.load_user_context("u1")).previous_summary is None
+
+
+def test_cache_hit_serves_the_snapshot_without_fetching(server, backend):
+    async def run():
+        first = await server.load_user_context("u1")
+        backend.latest_summary = make_summary(summary="Saved by another session.")
+        return first, await server.load_user_context("u1")
+    first, second = asyncio.run(run())
+    assert first.previous_summary == second.previous_summary == "Last week: squats 3x8."
+    assert backend.count("build:u1") == backend.count("/get-summary/u1") == 1
+
+
+def test_saved_summary_drops_the_cached_snapshot(server, backend):
+    async def run():
+        await server.load_user_context("u1")
+        backend.latest_summary = make_summary(summary="Leg day went well.")
+        server.context_cache.invalidate("u1")  # what _save_summary does on success
+        return await server.load_user_context("u1")
+    context = asyncio.run(run())
+    assert context.previous_summary == "Leg day went well."
+    assert context.version == 1
+    assert backend.count("/get-summary/u1") == 2
+
+
+def test_build_fetches_the_snapshot_with_the_user_data(server, backend):
+    # The real build, against a backend that knows nothing but the summary
+    server._build_user_context = LiveAPIWebSocketServer._build_user_context.__get__(server)
+    backend.latest_summary["summary"] = "Squats went well."
+    context = asyncio.run(server.load_user_context("u1"))
+    assert context.previous_summary == "Squats went well."
+    assert backend.count("/backend/user/u1") == backend.count("/get-summary/u1") == 1
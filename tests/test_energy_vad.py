@@ -0,0 +1,56 @@
+import numpy as np
+
+from server import EnergyVAD
+
+
+def tone(amplitude, n=960, freq=200.0, rate=16000):
+    t = np.arange(n) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype("<i2").tobytes()
+
+
+SILENCE = bytes(960 * 2)
+SPEECH = tone(8000)
+
+
+def make_vad(**kwargs):
+    kwargs.setdefault("threshold_dbfs", -45.0)
+    kwargs.setdefault("hangover_ms", 120)
+    kwargs.setdefault("frame_ms", 60)
+    kwargs.setdefault("keepalive_every", 0)
+    return EnergyVAD(**kwargs)
+
+
+def test_tone_is_speech_and_digital_silence_is_not():
+    vad = make_vad()
+    assert vad.is_speech(SPEECH)
+    assert not vad.is_speech(SILENCE)
+
+
+def test_quiet_broadband_noise_is_not_speech():
+    rng = np.random.default_rng(0)
+    # About -40 dBFS: over the threshold, but crossing zero on every other sample
+    noise = (rng.standard_normal(960) * 330).astype("<i2").tobytes()
+    assert not make_vad().is_speech(noise)
+
+
+def test_onset_sends_the_held_preroll_frame():
+    vad = make_vad()
+    assert vad.process(SILENCE) == ([], None)
+    frames, event = vad.process(SPEECH)
+    assert event == "speech_start"
+    assert frames == [SILENCE, SPEECH]
+
+
+def test_hangover_keeps_sending_then_reports_speech_end():
+    vad = make_vad()  # 120 ms hangover = 2 frames of 60 ms
+    vad.process(SPEECH)
+    assert vad.process(SILENCE) == ([SILENCE], None)
+    assert vad.process(SILENCE) == ([SILENCE], None)
+    assert vad.process(SILENCE) == ([], "speech_end")
+    assert not vad.active
+
+
+def test_keepalive_sends_every_nth_silent_frame():
+    vad = make_vad(keepalive_every=3)
+    sent = [bool(vad.process(SILENCE)[0]) for _ in range(6)]
+    assert sent == [False, False, True, False, False, True]
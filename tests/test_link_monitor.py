@@ -0,0 +1,76 @@
+import pytest
+
+import server
+from server import LinkMonitor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTransport:
+    def __init__(self):
+        self.buffered = 0
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
+
+
+def run_window(link, clock, wire_bytes=48000, audio_seconds=1.0, send_seconds=0.0):
+    """One second of audio sent in a single message, closing the measurement window."""
+    clock.now += server.ADAPTIVE_WINDOW_SECONDS
+    link.record(wire_bytes, audio_seconds, send_seconds)
+
+
+def test_growing_socket_buffer_steps_the_rate_down(clock):
+    transport = FakeTransport()
+    link = LinkMonitor(transport)
+    transport.buffered = 30000  # 48 KB sent, only 18 KB drained, 625 ms buffered
+    run_window(link, clock)
+    assert link.rate == 16000
+
+
+def test_queued_audio_steps_down_when_send_is_saturated(clock):
+    queued = [1.0]
+    link = LinkMonitor(FakeTransport(), queued_seconds=lambda: queued[0])
+    run_window(link, clock, send_seconds=0.95)
+    assert link.rate == 16000
+    run_window(link, clock, send_seconds=0.95)
+    assert link.rate == 8000
+
+
+def test_queued_audio_is_ignored_while_send_keeps_up(clock):
+    # A burst from the model queues audio, but the link sends it faster than real time
+    link = LinkMonitor(FakeTransport(), queued_seconds=lambda: 5.0)
+    run_window(link, clock, send_seconds=0.1)
+    assert link.rate == 24000
+
+
+def test_rate_recovers_after_a_clean_period(clock):
+    queued = [1.0]
+    link = LinkMonitor(FakeTransport(), queued_seconds=lambda: queued[0])
+    run_window(link, clock, send_seconds=0.95)
+    assert link.rate == 16000
+    queued[0] = 0.0
+    for _ in range(int(server.ADAPTIVE_RECOVER_SECONDS)):
+        run_window(link, clock, send_seconds=0.2)
+    assert link.rate == 24000
+
+
+def test_sender_reports_queued_playback_time():
+    sender = server.ClientSender(None)
+    sender.send_audio(b"\x00" * 48000, 24000)
+    sender.send_ordered({"type": "turn_complete", "turn": 0})
+    sender.send_audio(b"\x00" * 16000, 16000)
+    assert sender.queued_audio_seconds() == pytest.approx(1.5)
@@ -0,0 +1,47 @@
+import numpy as np
+
+from server import PolyphaseResampler
+
+
+def tone(freq, rate, seconds=0.5, amplitude=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype("<i2").tobytes()
+
+
+def samples(pcm):
+    return np.frombuffer(pcm, dtype="<i2")
+
+
+def test_output_length_follows_the_rate_ratio():
+    out = PolyphaseResampler(48000, 16000).process(tone(440, 48000))
+    assert len(samples(out)) == 8000
+
+
+def test_tone_survives_resampling():
+    out = samples(PolyphaseResampler(16000, 24000).process(tone(440, 16000))).astype(np.float64)
+    spectrum = np.abs(np.fft.rfft(out))
+    peak_hz = np.argmax(spectrum) * 24000 / len(out)
+    assert abs(peak_hz - 440) < 5
+
+
+def test_chunked_stream_matches_a_single_pass():
+    pcm = tone(300, 44100, seconds=0.2)
+    whole = PolyphaseResampler(44100, 16000).process(pcm)
+    chunked = PolyphaseResampler(44100, 16000)
+    out = b"".join(chunked.process(pcm[i:i + 882]) for i in range(0, len(pcm), 882))
+    assert out == whole
+
+
+def test_odd_length_chunks_carry_the_trailing_byte():
+    pcm = tone(300, 48000, seconds=0.1)
+    whole = PolyphaseResampler(48000, 16000).process(pcm)
+    chunked = PolyphaseResampler(48000, 16000)
+    # 333-byte chunks split samples across chunk boundaries
+    out = b"".join(chunked.process(memoryview(pcm)[i:i + 333]) for i in range(0, len(pcm), 333))
+    assert out == whole
+
+
+def test_half_sample_alone_produces_nothing_yet():
+    resampler = PolyphaseResampler(48000, 16000)
+    assert resampler.process(b"\x01") == b""
+    assert resampler.process(b"") == b""
@@ -0,0 +1,161 @@
+import asyncio
+
+from server import ClientSender, SessionSummaryState, SessionTranscript, SummaryWorkerPool, TranscriptJournal
+
+
+def make_state(*texts):
+    state = SessionSummaryState("c1", "u1", SessionTranscript())
+    for text in texts:
+        state.transcript.append("user", text, new_turn=True)
+    return state
+
+
+def start_pool(server, max_attempts=2):
+    server.summary_pool = SummaryWorkerPool(
+        server.summarize_and_store, workers=2, max_attempts=max_attempts, base_delay=0.001, max_delay=0.001
+    )
+    server.summary_pool.start()
+
+
+def stages(backend):
+    return [stage for stage, _, _ in backend.saved]
+
+
+def test_end_and_disconnect_share_one_summary(server, backend):
+    async def run():
+        start_pool(server)
+        state = make_state("Did squats.", "Knees felt fine.")
+        sender = ClientSender(None)
+        # The client's "end" and the disconnect cleanup race for the same transcript
+        await asyncio.gather(server.summarize_on_end(state, sender), server.finish_session(state))
+        await server.summary_pool.drain()
+        return state, sender
+    backend.generate_delay = 0.01
+    state, sender = asyncio.run(run())
+    assert stages(backend) == ["metrics", "detail"]
+    assert backend.count("/get-summary/") == 1
+    assert sender._control[-1] == {"type": "summary_saved", "data": "ok"}
+    assert state.status == "done"
+
+
+def test_concurrent_callers_wait_on_the_in_flight_job(server, backend):
+    async def run():
+        start_pool(server)
+        state = make_state("Did squats.")
+        first = asyncio.ensure_future(server.request_summary(state))
+        await asyncio.sleep(0)
+        assert state.status == "in_flight"
+        second = await server.request_summary(state)
+        return await first, second
+    backend.generate_delay = 0.01
+    assert asyncio.run(run()) == ("ok", "ok")
+    assert stages(backend).count("metrics") == 1
+
+
+def test_turns_added_while_in_flight_form_the_next_segment(server, backend):
+    async def run():
+        start_pool(server)
+        state = make_state("Did squats.")
+        first = asyncio.ensure_future(server.request_summary(state, checkpoint=True))
+        await asyncio.sleep(0)
+        state.transcript.append("user", "Then ran 5k.")
+        await first
+        await server.request_summary(state, checkpoint=True)
+        return state
+    backend.generate_delay = 0.01
+    state = asyncio.run(run())
+    assert [prompt[2] for prompt in backend.prompts] == ["USER: Did squats.", "USER: Then ran 5k."]
+    assert state.watermark == 2 and len(state.transcript.turns) == 0
+
+
+def test_failed_segment_rolls_the_watermark_back_for_a_fresh_job(server, backend):
+    async def run():
+        start_pool(server, max_attempts=2)
+        state = make_state("Did squats.", "Knees felt fine.")
+        failed = await server.request_summary(state, checkpoint=True)
+        snapshot = (state.watermark, state.status)
+        retried = await server.request_summary(state, checkpoint=True)
+        return failed, snapshot, retried, state
+    backend.generate_errors = [RuntimeError("quota"), RuntimeError("quota")]
+    failed, snapshot, retried, state = asyncio.run(run())
+    assert failed is None
+    assert snapshot == (0, "pending")
+    # The next trigger starts over with a new job covering the same turns
+    assert retried == "checkpoint"
+    assert len(backend.prompts) == 3
+    assert backend.prompts[2][2] == "USER: Did squats.\nUSER: Knees felt fine."
+    assert state.watermark == 2
+
+
+def test_detail_pass_updates_the_metrics_record(server, backend):
+    async def run():
+        start_pool(server)
+        state = make_state("Did squats.")
+        await server.request_summary(state)
+        detail_pending = state.detail is not None
+        await server.finish_session(state)
+        return state, detail_pending
+    state, detail_pending = asyncio.run(run())
+    assert detail_pending
+    assert state.detail is None
+    assert stages(backend) == ["metrics", "detail"]
+    assert backend.saved[0][2] == backend.saved[1][2]  # same summary_id
+    assert state.running_summary == backend.saved[1][1]
+
+
+def test_failed_detail_pass_keeps_the_metrics_record(server, backend):
+    async def run():
+        start_pool(server, max_attempts=1)
+        state = make_state("Did squats.")
+        await server.request_summary(state)
+        await server.finish_session(state)
+        return state
+    backend.save_results = ["ok", None]
+    state = asyncio.run(run())
+    assert stages(backend) == ["metrics"]
+    assert state.detail is None and state.status == "done"
+
+
+def test_finish_session_discards_the_journal_once_done(server, backend, tmp_path):
+    async def run():
+        start_pool(server)
+        state = make_state()
+        journal = TranscriptJournal.create(str(tmp_path), state)
+        state.transcript.journal = journal
+        state.transcript.append("user", "Did squats.")
+        await server.finish_session(state, journal)
+    asyncio.run(run())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_finish_session_keeps_the_journal_when_summarizing_fails(server, backend, tmp_path):
+    async def run():
+        start_pool(server, max_attempts=1)
+        state = make_state()
+        journal = TranscriptJournal.create(str(tmp_path), state)
+        state.transcript.journal = journal
+        state.transcript.append("user", "Did squats.")
+        await server.finish_session(state, journal)
+        return journal
+    backend.generate_errors = [RuntimeError("quota")]
+    journal = asyncio.run(run())
+    replayed = TranscriptJournal.replay(journal.path)
+    assert [turn.text for turn in replayed.transcript.turns] == ["Did squats."]
+
+
+def test_journal_stays_registered_until_finish_session_retires_it(server, backend, tmp_path):
+    async def run():
+        start_pool(server)
+        state = make_state()
+        journal = TranscriptJournal.create(str(tmp_path), state)
+        state.transcript.journal = journal
+        server.journals[journal.path] = journal
+        state.transcript.append("user", "Did squats.")
+        finishing = asyncio.ensure_future(server.finish_session(state, journal))
+        await asyncio.sleep(0)
+        registered = journal.path in server.journals
+        await finishing
+        return registered
+    backend.generate_delay = 0.01
+    assert asyncio.run(run()) is True
+    assert server.journals == {}
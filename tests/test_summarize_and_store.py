@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from server import SummaryJob, SummaryWorkerPool, TranscriptTurn, UserContext, build_summary_suffix
+
+
+def turns(*texts):
+    return [TranscriptTurn("user", text, n) for n, text in enumerate(texts)]
+
+
+def test_retry_after_failed_save_only_repeats_the_save(server, backend):
+    async def run():
+        server.summary_pool = SummaryWorkerPool(server.summarize_and_store, workers=1, base_delay=0.001, max_delay=0.001)
+        server.summary_pool.start()
+        job = SummaryJob("c1", "u1", turns("Hi, my name is Sam."))
+        result = await (await server.summary_pool.submit(job))
+        await server.summary_pool.drain()
+        return result, job.attempts
+    backend.save_results = [None, "ok"]
+    assert asyncio.run(run()) == ("ok", 2)
+    assert len(backend.prompts) == 1
+    assert backend.count("/save-name") == 1
+    assert backend.count("/get-summary/") == 1
+
+
+def test_empty_transcript_is_skipped_not_failed(server, backend):
+    assert asyncio.run(server.summarize_and_store(SummaryJob("c1", "u1", []))) == "skipped"
+    assert backend.requests == [] and backend.prompts == []
+
+
+def test_running_summary_is_passed_alongside_the_baseline(server, backend):
+    running = dict(backend.summary, summary="Earlier today: warm-up done.")
+    job = SummaryJob("c1", "u1", turns("Did lunges today."), running_summary=running)
+    asyncio.run(server.summarize_and_store(job))
+    previous, running_text, _ = backend.prompts[0]
+    assert previous == "Last week: squats 3x8."
+    assert json.loads(running_text)["summary"] == "Earlier today: warm-up done."
+    assert job.baseline_text == previous
+
+
+def test_known_baseline_is_not_fetched_again(server, backend):
+    job = SummaryJob("c1", "u1", turns("Hi"), baseline_text="")
+    asyncio.run(server.summarize_and_store(job))
+    assert backend.count("/get-summary/") == 0
+    assert backend.prompts[0][:2] == ("", "")
+
+
+def test_prompt_carries_both_summaries():
+    prompt = build_summary_suffix("s1", "2026-01-01T00:00:00+00:00", "before", "USER: hi", '{"a":1}')
+    assert prompt.index("PREVIOUS_SUMMARY:\nbefore") < prompt.index('RUNNING_SUMMARY:\n{"a":1}') < prompt.index("TRANSCRIPT:")
+    assert "RUNNING_SUMMARY" not in build_summary_suffix("s1", "t", "before", "USER: hi")
+
+
+def test_current_snapshot_is_used_and_a_stale_one_refetched(server, backend):
+    context = UserContext("instruction", "snapshot", server.context_cache.version("u1"))
+    job = SummaryJob("c1", "u1", turns("Hi"), context=context)
+    asyncio.run(server.summarize_and_store(job))
+    assert job.baseline_text == "snapshot"
+    assert backend.count("/get-summary/") == 0
+
+    server.context_cache.invalidate("u1")
+    job = SummaryJob("c1", "u1", turns("Hi"), context=context)
+    asyncio.run(server.summarize_and_store(job))
+    assert job.baseline_text == "Last week: squats 3x8."
+    assert backend.count("/get-summary/") == 1
@@ -0,0 +1,134 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from conftest import make_summary
+from server import SUMMARY_PROMPT_PREFIX, SUMMARY_SYSTEM_NOTE, SummaryJob, SummaryPrefixCache, TranscriptTurn
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    """Stands in for credentials.client: explicit caches and non-streaming generate_content."""
+
+    def __init__(self):
+        self.created = []           # (model, config) per caches.create call
+        self.create_errors = []     # raised by the next caches.create calls, in order
+        self.generated = []         # config per generate_content call
+        self.generate_errors = []   # raised by the next generate_content calls, in order
+        self.aio = SimpleNamespace(caches=self, models=self)
+
+    async def create(self, model, config):
+        if self.create_errors:
+            raise self.create_errors.pop(0)
+        self.created.append((model, config))
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    async def generate_content(self, model, contents, config):
+        self.generated.append((contents, config))
+        if self.generate_errors:
+            raise self.generate_errors.pop(0)
+        text = json.dumps(make_summary(summary="Leg day."))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=text)]))])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+def make_cache(client, **kwargs):
+    return SummaryPrefixCache(SimpleNamespace(client=client), enabled=True, min_tokens=0, **kwargs)
+
+
+def test_prefix_is_cached_once_and_reused(clock, client):
+    cache = make_cache(client, ttl=3600)
+    names = [asyncio.run(cache.get("gemini-2.0-flash-exp")) for _ in range(2)]
+    assert names == ["cachedContents/1", "cachedContents/1"]
+    model, config = client.created[0]
+    assert model == "gemini-2.0-flash-exp"
+    assert config.ttl == "3600s"
+    assert config.system_instruction == SUMMARY_SYSTEM_NOTE
+    assert config.contents[0].parts[0].text == SUMMARY_PROMPT_PREFIX
+
+
+def test_prefix_is_recreated_a_minute_before_the_ttl_runs_out(clock, client):
+    cache = make_cache(client, ttl=3600)
+    asyncio.run(cache.get("m"))
+    clock.now += 3539
+    assert asyncio.run(cache.get("m")) == "cachedContents/1"
+    clock.now += 1
+    assert asyncio.run(cache.get("m")) == "cachedContents/2"
+
+
+def test_failed_create_sends_the_prefix_inline_until_the_retry_delay(clock, client):
+    cache = make_cache(client)
+    client.create_errors = [RuntimeError("400 caching not supported")]
+    assert asyncio.run(cache.get("m")) is None
+    assert asyncio.run(cache.get("m")) is None
+    assert client.created == []
+    clock.now += server.SUMMARY_PREFIX_CACHE_RETRY_SECONDS
+    assert asyncio.run(cache.get("m")) == "cachedContents/1"
+
+
+def test_prefix_below_the_caching_minimum_is_never_cached(client):
+    cache = SummaryPrefixCache(SimpleNamespace(client=client), enabled=True)
+    assert not cache.enabled
+    assert asyncio.run(cache.get("m")) is None
+    assert client.created == []
+
+
+def summarize(srv):
+    job = SummaryJob("c1", "u1", [TranscriptTurn("user", "Hi", 0)], checkpoint=True)  # checkpoints do not stream
+    return asyncio.run(srv._generate_full_summary(job, "", "", "USER: Hi"))
+
+
+@pytest.fixture
+def cached_server(server, client, clock):
+    server.credentials = SimpleNamespace(client=client)
+    server.prefix_cache = make_cache(client)
+    return server
+
+
+def test_summary_uses_the_cached_prefix(cached_server, client):
+    assert summarize(cached_server)["summary"] == "Leg day."
+    contents, config = client.generated[0]
+    assert config.cached_content == "cachedContents/1"
+    assert config.system_instruction is None
+    assert len(contents[0].parts) == 1
+
+
+def test_cache_error_falls_back_to_the_inline_prefix(cached_server, client):
+    client.generate_errors = [RuntimeError("404 NOT_FOUND. CachedContent not found (or permission denied)")]
+    with pytest.raises(RuntimeError):
+        summarize(cached_server)
+    summarize(cached_server)
+    contents, config = client.generated[1]
+    assert config.cached_content is None
+    assert config.system_instruction == SUMMARY_SYSTEM_NOTE
+    assert contents[0].parts[0].text == SUMMARY_PROMPT_PREFIX
+
+
+def test_other_errors_keep_the_cache(cached_server, client):
+    client.generate_errors = [RuntimeError("429 RESOURCE_EXHAUSTED")]
+    with pytest.raises(RuntimeError):
+        summarize(cached_server)
+    summarize(cached_server)
+    assert [config.cached_content for _, config in client.generated] == ["cachedContents/1"] * 2
+    assert len(client.created) == 1
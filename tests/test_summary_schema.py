@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from conftest import make_summary
+from server import (
+    SUMMARY_RESPONSE_SCHEMA, SummaryFormatError, compile_normalizer, merge_summary_fields, normalize_summary_metrics,
+    parse_summary,
+)
+
+SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "score": {"type": "INTEGER", "minimum": 0, "maximum": 100},
+        "hours": {"type": "NUMBER", "nullable": True, "minimum": 0, "maximum": 24},
+        "note": {"type": "STRING", "nullable": True},
+        "title": {"type": "STRING"},
+        "flag": {"type": "BOOLEAN"},
+        "tags": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+}
+
+
+def test_numbers_are_coerced_and_clamped():
+    normalize = compile_normalizer(SCHEMA)
+    assert normalize({"score": "72.6", "hours": 30})["score"] == 73
+    assert normalize({"score": -5})["score"] == 0
+    assert normalize({"hours": "7.5"})["hours"] == 7.5
+    assert normalize({"hours": 30})["hours"] == 24
+
+
+def test_bad_numbers_fall_back_to_the_default():
+    normalize = compile_normalizer(SCHEMA)
+    for bad in ("lots", True, float("nan"), float("inf"), [3]):
+        result = normalize({"score": bad, "hours": bad})
+        assert (result["score"], result["hours"]) == (0, None)
+
+
+def test_missing_fields_get_defaults_and_unknown_keys_are_dropped():
+    assert compile_normalizer(SCHEMA)({"extra": 1}) == {
+        "score": 0, "hours": None, "note": None, "title": "", "flag": False, "tags": [],
+    }
+
+
+def test_booleans_strings_and_arrays():
+    result = compile_normalizer(SCHEMA)({"flag": "Yes", "title": 12, "tags": ["a", 2, None]})
+    assert result["flag"] is True
+    assert result["title"] == "12"
+    assert result["tags"] == ["a", "2", ""]
+    assert compile_normalizer(SCHEMA)({"flag": "no", "tags": "a"})["flag"] is False
+
+
+def test_non_object_input_becomes_all_defaults():
+    assert compile_normalizer(SCHEMA)(["not", "an", "object"])["title"] == ""
+
+
+def test_parse_summary_fills_the_whole_response_schema():
+    text = json.dumps({
+        "summary": "Upper body day.",
+        "energy_level": "80",
+        "workoutPlan": {"exercises": [{"day": "Mon", "routines": [{"name": "Push-up", "sets": "3", "reps": 12.4}]}]},
+        "training_focus_areas": [{"name": "strength_training", "confidence": 1.7}],
+    })
+    summary = parse_summary(text)
+    assert set(summary) == set(SUMMARY_RESPONSE_SCHEMA["properties"])
+    assert summary["energy_level"] == 80
+    assert summary["workoutPlan"]["exercises"][0]["routines"][0] == {"name": "Push-up", "sets": 3, "reps": 12}
+    assert summary["training_focus_areas"][0]["confidence"] == 1.0
+    assert summary["risk_flags"]["mentions_injury_pain"] is False
+
+
+def test_metrics_pass_scores_may_stay_null():
+    metrics = parse_summary('{"energy_level": null, "motivation_level": 55}', normalize_summary_metrics)
+    assert (metrics["energy_level"], metrics["motivation_level"]) == (None, 55)
+    assert "workoutPlan" not in metrics
+
+
+@pytest.mark.parametrize("text", ["", "not json", '{"summary": ', "[1, 2]", '"text"', None])
+def test_parse_summary_rejects_non_objects(text):
+    with pytest.raises(SummaryFormatError):
+        parse_summary(text)
+
+
+def test_metrics_merge_keeps_running_values_the_segment_left_null():
+    running = make_summary(summary="Leg day.", energy_level=70, sleep_duration_hours=7.5,
+                           workoutPlan={"schedule": ["Mon"]})
+    metrics = normalize_summary_metrics({"summary": "", "sleep_duration_hours": 6})
+    merged = merge_summary_fields(running, metrics)
+    assert (merged["summary"], merged["energy_level"], merged["sleep_duration_hours"]) == ("Leg day.", 70, 6.0)
+    assert merged["workoutPlan"]["schedule"] == ["Mon"]
+    assert running["sleep_duration_hours"] == 7.5
+
+
+def test_metrics_merge_without_a_running_summary_keeps_every_key():
+    metrics = normalize_summary_metrics({"energy_level": 40})
+    assert merge_summary_fields(None, metrics) == metrics
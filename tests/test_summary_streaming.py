@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from server import ClientSender, JsonFieldStream, SummaryJob
+
+DOCUMENT = json.dumps({
+    "summary": "Said \"no pain\", then {stretched} [twice]\\done",
+    "energy_level": 72,
+    "risk_flags": {"mentions_injury_pain": False, "notes": ["a,b", "}"]},
+    "main_points": ["squats", "lunges"],
+    "sleep_duration_hours": None,
+})
+
+
+def feed_all(pieces):
+    stream = JsonFieldStream()
+    fields = []
+    for piece in pieces:
+        fields.extend(stream.feed(piece))
+    return fields
+
+
+def test_whole_document_yields_every_field_in_order():
+    assert feed_all([DOCUMENT]) == list(json.loads(DOCUMENT).items())
+
+
+def test_every_split_point_gives_the_same_fields():
+    expected = list(json.loads(DOCUMENT).items())
+    for cut in range(1, len(DOCUMENT)):
+        assert feed_all([DOCUMENT[:cut], DOCUMENT[cut:]]) == expected, cut
+
+
+def test_one_character_at_a_time():
+    assert feed_all(DOCUMENT) == list(json.loads(DOCUMENT).items())
+
+
+def test_fields_are_reported_as_soon_as_they_complete():
+    stream = JsonFieldStream()
+    assert stream.feed('{"summary": "Leg da') == []
+    assert stream.feed('y", "energy_') == [("summary", "Leg day")]
+    assert stream.feed('level": 5') == []
+    assert stream.feed("0}") == [("energy_level", 50)]
+
+
+def test_only_the_open_member_is_kept():
+    stream = JsonFieldStream()
+    stream.feed('{"summary": "' + "x" * 1000 + '", "main_points": ["a", ')
+    assert "".join(stream._member) == ' "main_points": ["a", '
+
+
+def test_malformed_member_is_skipped():
+    assert feed_all(['{"a": 1, "b": tru, "c": 3}']) == [("a", 1), ("c", 3)]
+
+
+def test_progress_is_pushed_to_the_connected_client(server):
+    sender = ClientSender(None)
+    job = SummaryJob("c1", "u1", [], sender=sender)
+    server._push_progress(job, "metrics", {"energy_level": 70})
+    assert sender._control[0] == {
+        "type": "summary_progress", "summary_id": job.summary_id, "stage": "metrics", "data": {"energy_level": 70},
+    }
+
+
+def test_progress_is_not_pushed_to_a_closed_sender(server):
+    async def run():
+        sender = ClientSender(None)
+        sender.start()
+        await sender.close()
+        return sender
+    sender = asyncio.run(run())
+    job = SummaryJob("c1", "u1", [], sender=sender)
+    server._push_progress(job, "full", {"summary": "done"})
+    assert job.sender is None
+    assert not sender._control
@@ -0,0 +1,80 @@
+import asyncio
+
+from server import SummaryJob, SummaryWorkerPool
+
+
+def make_pool(handler, **kwargs):
+    kwargs.setdefault("workers", 1)
+    kwargs.setdefault("base_delay", 0.001)
+    kwargs.setdefault("max_delay", 0.001)
+    return SummaryWorkerPool(handler, **kwargs)
+
+
+def test_job_result_resolves_with_handler_result():
+    async def run():
+        async def handler(job):
+            return f"ok-{job.uid}"
+        pool = make_pool(handler)
+        pool.start()
+        result = await (await pool.submit(SummaryJob("c1", "u1", [])))
+        await pool.drain()
+        return result
+    assert asyncio.run(run()) == "ok-u1"
+
+
+def test_failed_attempts_are_retried():
+    async def run():
+        outcomes = [RuntimeError("boom"), None, "ok"]
+
+        async def handler(job):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        pool = make_pool(handler, max_attempts=3)
+        pool.start()
+        job = SummaryJob("c1", "u1", [])
+        result = await (await pool.submit(job))
+        await pool.drain()
+        return result, job.attempts
+    assert asyncio.run(run()) == ("ok", 3)
+
+
+def test_exhausted_retries_resolve_to_none():
+    async def run():
+        async def handler(job):
+            return None
+        pool = make_pool(handler, max_attempts=2)
+        pool.start()
+        job = SummaryJob("c1", "u1", [])
+        result = await (await pool.submit(job))
+        await pool.drain()
+        return result, job.attempts
+    assert asyncio.run(run()) == (None, 2)
+
+
+def test_submit_drops_job_when_backlog_stays_full():
+    async def run():
+        async def handler(job):
+            return "ok"
+        pool = make_pool(handler, maxsize=1)  # not started, so nothing drains the queue
+        await pool.submit(SummaryJob("c1", "u1", []))
+        dropped = await pool.submit(SummaryJob("c2", "u2", []), timeout=0.01)
+        return dropped.result()
+    assert asyncio.run(run()) is None
+
+
+def test_drain_finishes_queued_jobs_then_refuses_new_ones():
+    async def run():
+        async def handler(job):
+            await asyncio.sleep(0.001)
+            return job.uid
+        pool = make_pool(handler, workers=2)
+        pool.start()
+        futures = [await pool.submit(SummaryJob(f"c{n}", f"u{n}", [])) for n in range(5)]
+        await pool.drain()
+        late = await pool.submit(SummaryJob("c9", "u9", []))
+        return [f.result() for f in futures], late.result()
+    results, late = asyncio.run(run())
+    assert results == [f"u{n}" for n in range(5)]
+    assert late is None
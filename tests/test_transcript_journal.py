@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timezone
+
+from conftest import make_summary
+from server import SessionSummaryState, SessionTranscript, TranscriptJournal
+
+STARTED = datetime(2026, 3, 1, 9, 30, tzinfo=timezone.utc)
+
+
+def journaled_state(tmp_path, uid="u1"):
+    state = SessionSummaryState("c1", uid, SessionTranscript(STARTED), started_at=STARTED)
+    journal = TranscriptJournal.create(str(tmp_path), state)
+    state.transcript.journal = journal
+    return state, journal
+
+
+def test_replay_rebuilds_turns_and_offsets(tmp_path):
+    state, journal = journaled_state(tmp_path)
+    state.transcript.append("user", "Hello ", offset_ns=1_000_000_000)
+    state.transcript.append("user", "there", offset_ns=1_500_000_000)
+    state.transcript.append("assistant", "Hi!", offset_ns=3_000_000_000)
+    state.transcript.seal()
+    state.transcript.append("assistant", "How are you?", offset_ns=4_000_000_000)
+    journal.record({"op": "handle", "id": "h-1"})
+    asyncio.run(journal.flush())
+
+    replayed = TranscriptJournal.replay(journal.path)
+    assert (replayed.client_id, replayed.uid, replayed.session_handle) == ("c1", "u1", "h-1")
+    assert [(t.role, t.text) for t in replayed.transcript.turns] == [
+        ("user", "Hello there"), ("assistant", "Hi!"), ("assistant", "How are you?"),
+    ]
+    assert [t.offset_ns for t in replayed.transcript.turns] == [1_000_000_000, 3_000_000_000, 4_000_000_000]
+    assert replayed.ended_at == datetime(2026, 3, 1, 9, 30, 4, tzinfo=timezone.utc)
+
+
+def test_replay_restores_the_summarized_watermark(tmp_path):
+    state, journal = journaled_state(tmp_path)
+    for n in range(3):
+        state.transcript.append("user", f"turn {n}", new_turn=True, offset_ns=n)
+    journal.record({"op": "summarized", "upto": 2, "summary": make_summary(energy_level=60), "saved": False})
+    asyncio.run(journal.flush())
+
+    replayed = TranscriptJournal.replay(journal.path)
+    assert replayed.watermark == 2
+    assert len(replayed.transcript) == 3
+    assert [t.text for t in replayed.transcript[2:]] == ["turn 2"]
+    assert replayed.running_summary == make_summary(energy_level=60)
+    assert replayed.unsaved is True
+
+
+def test_replay_skips_a_torn_last_line(tmp_path):
+    state, journal = journaled_state(tmp_path)
+    state.transcript.append("user", "complete", offset_ns=0)
+    asyncio.run(journal.flush())
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "append", "role": "user", "te')
+
+    replayed = TranscriptJournal.replay(journal.path)
+    assert [t.text for t in replayed.transcript.turns] == ["complete"]
+
+
+def test_replay_without_a_uid_is_unusable(tmp_path):
+    state, journal = journaled_state(tmp_path, uid=None)
+    state.transcript.append("user", "anonymous", offset_ns=0)
+    asyncio.run(journal.flush())
+    assert TranscriptJournal.replay(journal.path) is None
+
+
+def test_discard_removes_the_file(tmp_path):
+    state, journal = journaled_state(tmp_path)
+    asyncio.run(journal.flush())
+    asyncio.run(journal.discard())
+    assert list(tmp_path.iterdir()) == []